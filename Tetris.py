@@ -1,25 +1,126 @@
 import pygame
+import numpy as np
+import argparse
+import json
+import os
 import sys
-import random
-from dataclasses import dataclass
-
-pygame.init()
+import time
+from collections import OrderedDict
+
+from backends import open_backend
+from bot import Bot
+from profiler import FrameProfiler
+from capture import open_capture
+from controls import Controls, InputLatency
+from replay import ReplayPlayer, ReplayWriter
+from engine import (
+    COLS,
+    ROWS,
+    SHAPES,
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW,
+    ACTION_HARD_DROP,
+    ACTION_HOLD,
+    ACTION_SOFT_DROP_ON,
+    GameState,
+    Piece,
+    difficulty_multiplier,
+)
 
 CELL = 24
-COLS = 10
-ROWS = 20
 
 PANEL_W = 220
 WIDTH = COLS * CELL + PANEL_W
 HEIGHT = ROWS * CELL
 
-screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED)
-pygame.display.set_caption("TETRIS • Modern Neon Deluxe (Progressive)")
-clock = pygame.time.Clock()
-
-FONT = pygame.font.SysFont("consolas", 18)
-MID_FONT = pygame.font.SysFont("consolas", 24, bold=True)
-BIG_FONT = pygame.font.SysFont("consolas", 46, bold=True)
+# Logic runs in fixed LOGIC_TICK_MS steps whatever the frame rate, so
+# frames are paced by vsync where an accelerated renderer offers it and
+# capped at the display's refresh rate otherwise. TETRIS_FPS sets a cap
+# instead (0 for none).
+LOGIC_TICK_MS = 4
+MAX_FRAME_MS = 250
+PARTICLE_STEP_MS = 16
+VSYNC_FPS_CAP = 240
+FPS_CAP = os.environ.get("TETRIS_FPS")
+# "surface" blits in software, "texture" draws uploaded textures through
+# an SDL renderer.
+RENDERER = os.environ.get("TETRIS_RENDERER", "surface")
+
+# SysFont() scans every installed font (fc-list on Linux) before it can
+# match a name, so the match is remembered across runs.
+FONT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "neon-tetris",
+    "fonts.json",
+)
+
+screen = None
+clock = None
+VSYNC = False
+FRAME_CAP = 60
+
+FONT = None
+MID_FONT = None
+BIG_FONT = None
+
+def load_font_cache():
+    try:
+        with open(FONT_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_font_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_PATH), exist_ok=True)
+        with open(FONT_CACHE_PATH, "w") as f:
+            json.dump(cache, f, indent=2)
+    except OSError:
+        pass
+
+def resolve_font(name, bold, cache):
+    key = f"{name}:{'bold' if bold else 'regular'}"
+    entry = cache.get(key)
+    if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+        entry = cache[key] = pygame.font.SysFont(name, 0, bold, constructor=lambda path, size, fake_bold, italic: [path, fake_bold])
+    return entry
+
+def sys_font(name, size, bold, cache):
+    path, fake_bold = resolve_font(name, bold, cache)
+    return pygame.sysfont.font_constructor(path, size, fake_bold, False)
+
+def refresh_rate():
+    # Only pygame-ce can ask; it answers 0 when the display doesn't say.
+    current = getattr(pygame.display, "get_current_refresh_rate", None)
+    return (current() if current is not None else 0) or 60
+
+def init_display(renderer=None):
+    # Everything that needs a window is created here on first use, rather
+    # than at import, and only the subsystems the game uses are started.
+    global screen, clock, VSYNC, FRAME_CAP, FONT, MID_FONT, BIG_FONT
+    if screen is not None:
+        return screen
+    pygame.display.init()
+    pygame.font.init()
+
+    screen = open_backend(renderer or RENDERER, "TETRIS • Modern Neon Deluxe (Progressive)", (WIDTH, HEIGHT))
+    VSYNC = screen.vsync
+    if FPS_CAP is not None:
+        FRAME_CAP = int(FPS_CAP)
+    else:
+        FRAME_CAP = VSYNC_FPS_CAP if VSYNC else refresh_rate()
+    clock = pygame.time.Clock()
+
+    cache = load_font_cache()
+    known = dict(cache)
+    FONT = sys_font("consolas", 18, False, cache)
+    MID_FONT = sys_font("consolas", 24, True, cache)
+    BIG_FONT = sys_font("consolas", 46, True, cache)
+    if cache != known:
+        save_font_cache(cache)
+    return screen
 
 BLACK = (6, 6, 12)
 PANEL_BG = (12, 12, 22)
@@ -35,54 +136,10 @@ NEON = {
     "Z": (255, 60, 120),
     "J": (80, 140, 255),
     "L": (255, 160, 0),
+    "G": (120, 120, 150),
     "GHOST": (200, 200, 220),
 }
 
-SHAPES = {
-    "I": [
-        [(0, 1), (1, 1), (2, 1), (3, 1)],
-        [(2, 0), (2, 1), (2, 2), (2, 3)],
-        [(0, 2), (1, 2), (2, 2), (3, 2)],
-        [(1, 0), (1, 1), (1, 2), (1, 3)],
-    ],
-    "O": [
-        [(1, 0), (2, 0), (1, 1), (2, 1)],
-        [(1, 0), (2, 0), (1, 1), (2, 1)],
-        [(1, 0), (2, 0), (1, 1), (2, 1)],
-        [(1, 0), (2, 0), (1, 1), (2, 1)],
-    ],
-    "T": [
-        [(1, 0), (0, 1), (1, 1), (2, 1)],
-        [(1, 0), (1, 1), (2, 1), (1, 2)],
-        [(0, 1), (1, 1), (2, 1), (1, 2)],
-        [(1, 0), (0, 1), (1, 1), (1, 2)],
-    ],
-    "S": [
-        [(1, 0), (2, 0), (0, 1), (1, 1)],
-        [(1, 0), (1, 1), (2, 1), (2, 2)],
-        [(1, 1), (2, 1), (0, 2), (1, 2)],
-        [(0, 0), (0, 1), (1, 1), (1, 2)],
-    ],
-    "Z": [
-        [(0, 0), (1, 0), (1, 1), (2, 1)],
-        [(2, 0), (1, 1), (2, 1), (1, 2)],
-        [(0, 1), (1, 1), (1, 2), (2, 2)],
-        [(1, 0), (0, 1), (1, 1), (0, 2)],
-    ],
-    "J": [
-        [(0, 0), (0, 1), (1, 1), (2, 1)],
-        [(1, 0), (2, 0), (1, 1), (1, 2)],
-        [(0, 1), (1, 1), (2, 1), (2, 2)],
-        [(1, 0), (1, 1), (0, 2), (1, 2)],
-    ],
-    "L": [
-        [(2, 0), (0, 1), (1, 1), (2, 1)],
-        [(1, 0), (1, 1), (1, 2), (2, 2)],
-        [(0, 1), (1, 1), (2, 1), (0, 2)],
-        [(0, 0), (1, 0), (1, 1), (1, 2)],
-    ],
-}
-
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
@@ -94,135 +151,132 @@ def darken(c, amt=95):
     r, g, b = c
     return (clamp(r - amt, 0, 255), clamp(g - amt, 0, 255), clamp(b - amt, 0, 255))
 
-@dataclass
-class Piece:
-    kind: str
-    x: int
-    y: int
-    rot: int = 0
-
-    def cells(self):
-        return [(self.x + cx, self.y + cy) for cx, cy in SHAPES[self.kind][self.rot]]
-
-def empty_board():
-    return [[None for _ in range(COLS)] for _ in range(ROWS)]
-
-def in_bounds(x, y):
-    return 0 <= x < COLS and y < ROWS
-
-def valid(piece, board):
-    for x, y in piece.cells():
-        if not in_bounds(x, y):
-            return False
-        if y >= 0 and board[y][x] is not None:
-            return False
-    return True
-
-def lock_piece(piece, board):
-    for x, y in piece.cells():
-        if y >= 0:
-            board[y][x] = piece.kind
-
-def clear_lines(board):
-    full_rows = [i for i, row in enumerate(board) if all(cell is not None for cell in row)]
-    if not full_rows:
-        return board, 0, []
-    new_board = [row for row in board if any(cell is None for cell in row)]
-    cleared = ROWS - len(new_board)
-    while len(new_board) < ROWS:
-        new_board.insert(0, [None for _ in range(COLS)])
-    return new_board, cleared, full_rows
-
-def new_bag():
-    bag = list(SHAPES.keys())
-    random.shuffle(bag)
-    return bag
-
-def spawn_piece(kind):
-    return Piece(kind=kind, x=3, y=-2, rot=0)
-
-def get_drop_y(piece, board):
-    ghost = Piece(piece.kind, piece.x, piece.y, piece.rot)
-    while True:
-        ghost.y += 1
-        if not valid(ghost, board):
-            ghost.y -= 1
-            break
-    return ghost.y
-
-def difficulty_multiplier(level):
-    return 2 ** ((level - 1) // 2)
-
-def fall_speed_ms(level):
-    base = max(65, 720 - (level - 1) * 55)
-    mult = difficulty_multiplier(level)
-    return max(35, int(base / mult))
-
-def scoring_for_lines(cleared, level):
-    if cleared == 1: return 100 * level
-    if cleared == 2: return 300 * level
-    if cleared == 3: return 500 * level
-    if cleared == 4: return 800 * level
-    return 0
-
-def is_tetris(cleared):
-    return cleared == 4
-
 def glow_circle(surface, x, y, radius, color, alpha):
     pygame.draw.circle(surface, (*color, alpha), (int(x), int(y)), int(radius))
 
-def draw_background_glow():
+def draw_background_glow(target=None):
+    if target is None:
+        target = screen
     glow = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
     glow_circle(glow, 95, 120, 120, (0, 255, 255), 38)
     glow_circle(glow, 160, 360, 160, (210, 0, 255), 32)
     glow_circle(glow, 360, 220, 160, (0, 255, 120), 28)
     glow_circle(glow, 430, 460, 180, (255, 60, 120), 20)
-    screen.blit(glow, (0, 0))
-
-def neon_text(text, font, x, y, color):
-    shadow = font.render(text, True, color)
+    target.blit(glow, (0, 0))
+
+TEXT_CACHE_SIZE = 256
+TEXT_CACHE = OrderedDict()
+
+def cached_surface(key, build):
+    surf = TEXT_CACHE.get(key)
+    if surf is not None:
+        TEXT_CACHE.move_to_end(key)
+        return surf
+    surf = TEXT_CACHE[key] = build()
+    if len(TEXT_CACHE) > TEXT_CACHE_SIZE:
+        TEXT_CACHE.popitem(last=False)
+    return surf
+
+def render_text(text, font, color):
+    return cached_surface(("text", text, font, color), lambda: font.render(text, True, color))
+
+def render_neon_glow(text, font, color):
+    shadow = render_text(text, font, color)
     glow = pygame.Surface((shadow.get_width() + 14, shadow.get_height() + 14), pygame.SRCALPHA)
     glow.blit(shadow, (7, 7))
+    return glow
+
+def neon_text(text, font, x, y, color):
+    glow = cached_surface(("glow", text, font, color), lambda: render_neon_glow(text, font, color))
     for _ in [28, 18]:
         screen.blit(glow, (x - 7, y - 7))
-    screen.blit(font.render(text, True, WHITE), (x, y))
+    screen.blit(render_text(text, font, WHITE), (x, y))
 
-def draw_glass_playfield():
+def draw_glass_playfield(target):
     rect = pygame.Rect(0, 0, COLS * CELL, HEIGHT)
     glass = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
     glass.fill((*GLASS, 220))
-    screen.blit(glass, rect.topleft)
-    pygame.draw.rect(screen, (0, 255, 255), rect, 2, border_radius=8)
+    target.blit(glass, rect.topleft)
+    pygame.draw.rect(target, (0, 255, 255), rect, 2, border_radius=8)
 
-def draw_grid():
+def draw_grid(target):
     for x in range(COLS + 1):
-        pygame.draw.line(screen, GRID_LINE, (x * CELL, 0), (x * CELL, HEIGHT), 1)
+        pygame.draw.line(target, GRID_LINE, (x * CELL, 0), (x * CELL, HEIGHT), 1)
     for y in range(ROWS + 1):
-        pygame.draw.line(screen, GRID_LINE, (0, y * CELL), (COLS * CELL, y * CELL), 1)
+        pygame.draw.line(target, GRID_LINE, (0, y * CELL), (COLS * CELL, y * CELL), 1)
+
+def build_play_layer():
+    layer = screen.convert(pygame.Surface((WIDTH, HEIGHT)), alpha=False)
+    layer.fill(BLACK)
+    draw_background_glow(layer)
+    draw_glass_playfield(layer)
+    draw_grid(layer)
+    return layer
+
+def build_dimmed_layer(dim):
+    layer = screen.convert(pygame.Surface((WIDTH, HEIGHT)), alpha=False)
+    layer.fill(BLACK)
+    draw_background_glow(layer)
+    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    overlay.fill((0, 0, 0, dim))
+    layer.blit(overlay, (0, 0))
+    return layer
+
+STATIC_LAYERS = {}
+STATIC_BUILDERS = {
+    "play": build_play_layer,
+    "menu": lambda: build_dimmed_layer(170),
+    "controls": lambda: build_dimmed_layer(175),
+}
 
-def draw_block_neon(px, py, color, alpha=255):
-    glow = pygame.Surface((CELL * 3, CELL * 3), pygame.SRCALPHA)
-    gx, gy = CELL, CELL
+def static_layer(name):
+    # Both backends draw at the fixed logical size, so a layer is built
+    # once and kept for the life of the window.
+    layer = STATIC_LAYERS.get(name)
+    if layer is None:
+        layer = STATIC_LAYERS[name] = STATIC_BUILDERS[name]()
+    return layer
+
+def draw_static_layer(name):
+    screen.blit(static_layer(name), (0, 0))
+
+BLOCK_SPRITES = {}
+MINI_SPRITES = {}
+
+def render_block_neon(color, alpha, cell):
+    glow = pygame.Surface((cell * 3, cell * 3), pygame.SRCALPHA)
+    gx, gy = cell, cell
     for r, a in [(14, 28), (9, 40)]:
         pygame.draw.rect(
             glow,
             (*color, int(a * (alpha / 255))),
-            (gx - r // 2, gy - r // 2, CELL + r, CELL + r),
+            (gx - r // 2, gy - r // 2, cell + r, cell + r),
             border_radius=10,
         )
-    screen.blit(glow, (px - CELL, py - CELL))
 
-    surf = pygame.Surface((CELL, CELL), pygame.SRCALPHA)
+    surf = pygame.Surface((cell, cell), pygame.SRCALPHA)
     surf.fill((*color, alpha))
 
     top = lighten(color, 60)
     bottom = darken(color, 100)
 
-    pygame.draw.polygon(surf, (*top, alpha), [(0, 0), (CELL, 0), (CELL - 5, 5), (5, 5)])
-    pygame.draw.polygon(surf, (*bottom, alpha), [(0, CELL), (CELL, CELL), (CELL - 5, CELL - 5), (5, CELL - 5)])
+    pygame.draw.polygon(surf, (*top, alpha), [(0, 0), (cell, 0), (cell - 5, 5), (5, 5)])
+    pygame.draw.polygon(surf, (*bottom, alpha), [(0, cell), (cell, cell), (cell - 5, cell - 5), (5, cell - 5)])
+
+    pygame.draw.rect(surf, (255, 255, 255, 70), (3, 3, cell - 6, cell - 6), 2)
+    pygame.draw.rect(surf, (0, 0, 0, 140), (0, 0, cell, cell), 2)
+    return screen.convert(glow), screen.convert(surf)
+
+def block_sprites(color, alpha=255, cell=CELL):
+    key = (color, alpha, cell)
+    sprites = BLOCK_SPRITES.get(key)
+    if sprites is None:
+        sprites = BLOCK_SPRITES[key] = render_block_neon(color, alpha, cell)
+    return sprites
 
-    pygame.draw.rect(surf, (255, 255, 255, 70), (3, 3, CELL - 6, CELL - 6), 2)
-    pygame.draw.rect(surf, (0, 0, 0, 140), (0, 0, CELL, CELL), 2)
+def draw_block_neon(px, py, color, alpha=255):
+    glow, surf = block_sprites(color, alpha)
+    screen.blit(glow, (px - CELL, py - CELL))
     screen.blit(surf, (px, py))
 
 def draw_board(board):
@@ -232,10 +286,21 @@ def draw_board(board):
             if kind:
                 draw_block_neon(x * CELL, y * CELL, NEON[kind])
 
-def draw_piece(piece, color, alpha=255):
+def draw_piece(piece, color, alpha=255, offset=0):
     for x, y in piece.cells():
         if y >= 0:
-            draw_block_neon(x * CELL, y * CELL, color, alpha)
+            draw_block_neon(x * CELL, y * CELL + offset, color, alpha)
+
+def mini_block_sprite(color, mini_cell):
+    key = (color, 255, mini_cell)
+    surf = MINI_SPRITES.get(key)
+    if surf is None:
+        surf = pygame.Surface((mini_cell, mini_cell), pygame.SRCALPHA)
+        surf.fill((*color, 255))
+        pygame.draw.rect(surf, (255, 255, 255, 110), (3, 3, mini_cell - 6, mini_cell - 6), 2)
+        pygame.draw.rect(surf, (0, 0, 0, 140), (0, 0, mini_cell, mini_cell), 2)
+        surf = MINI_SPRITES[key] = screen.convert(surf)
+    return surf
 
 def draw_mini_piece(px, py, kind, scale=0.7):
     mini_cell = int(CELL * scale)
@@ -244,127 +309,188 @@ def draw_mini_piece(px, py, kind, scale=0.7):
     miny = min(c[1] for c in coords)
     coords = [(c[0] - minx, c[1] - miny) for c in coords]
 
+    surf = mini_block_sprite(NEON[kind], mini_cell)
     for cx, cy in coords:
-        x = px + cx * mini_cell
-        y = py + cy * mini_cell
-        surf = pygame.Surface((mini_cell, mini_cell), pygame.SRCALPHA)
-        col = NEON[kind]
-        surf.fill((*col, 255))
-        pygame.draw.rect(surf, (255, 255, 255, 110), (3, 3, mini_cell - 6, mini_cell - 6), 2)
-        pygame.draw.rect(surf, (0, 0, 0, 140), (0, 0, mini_cell, mini_cell), 2)
-        screen.blit(surf, (x, y))
+        screen.blit(surf, (px + cx * mini_cell, py + cy * mini_cell))
 
 def draw_panel(score, level, lines, hold, next_queue, paused, combo, b2b):
     px = COLS * CELL
-    pygame.draw.rect(screen, PANEL_BG, (px, 0, PANEL_W, HEIGHT))
-    pygame.draw.line(screen, (0, 255, 255), (px, 0), (px, HEIGHT), 2)
+    screen.fill_rect(PANEL_BG, (px, 0, PANEL_W, HEIGHT))
+    screen.line((0, 255, 255), (px, 0), (px, HEIGHT), 2)
 
     neon_text("TETRIS", BIG_FONT, px + 22, 14, (0, 255, 255))
 
     mult = difficulty_multiplier(level)
-    screen.blit(FONT.render(f"Score: {score}", True, WHITE), (px + 16, 92))
-    screen.blit(FONT.render(f"Level: {level}", True, WHITE), (px + 16, 118))
-    screen.blit(FONT.render(f"Lines: {lines}", True, WHITE), (px + 16, 144))
-    screen.blit(FONT.render(f"Speed x{mult}", True, (220, 220, 240)), (px + 16, 170))
-    screen.blit(FONT.render(f"Combo: {combo}", True, WHITE), (px + 16, 198))
-    screen.blit(FONT.render(f"B2B: {'ON' if b2b else 'OFF'}", True, WHITE), (px + 16, 224))
-
-    screen.blit(FONT.render("Hold:", True, WHITE), (px + 16, 262))
+    screen.blit(render_text(f"Score: {score}", FONT, WHITE), (px + 16, 92))
+    screen.blit(render_text(f"Level: {level}", FONT, WHITE), (px + 16, 118))
+    screen.blit(render_text(f"Lines: {lines}", FONT, WHITE), (px + 16, 144))
+    screen.blit(render_text(f"Speed x{mult}", FONT, (220, 220, 240)), (px + 16, 170))
+    screen.blit(render_text(f"Combo: {combo}", FONT, WHITE), (px + 16, 198))
+    screen.blit(render_text(f"B2B: {'ON' if b2b else 'OFF'}", FONT, WHITE), (px + 16, 224))
+
+    screen.blit(render_text("Hold:", FONT, WHITE), (px + 16, 262))
     if hold:
         draw_mini_piece(px + 26, 290, hold)
 
-    screen.blit(FONT.render("Next:", True, WHITE), (px + 16, 365))
+    screen.blit(render_text("Next:", FONT, WHITE), (px + 16, 365))
     if next_queue:
         draw_mini_piece(px + 26, 395, next_queue[0], scale=0.78)
 
     if paused:
-        overlay = pygame.Surface((COLS * CELL, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 170))
-        screen.blit(overlay, (0, 0))
+        screen.fill_rect((0, 0, 0, 170), (0, 0, COLS * CELL, HEIGHT))
         neon_text("PAUSED", BIG_FONT, 55, HEIGHT // 2 - 55, (210, 0, 255))
 
-class Particle:
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.vx = random.uniform(-2.0, 2.0)
-        self.vy = random.uniform(-4.0, -1.0)
-        self.life = random.randint(22, 40)
-        self.color = color
+PARTICLE_CAP = 1024
+PARTICLE_ALPHA_STEP = 10
+PARTICLE_COLORS = [(0, 255, 255)] + [NEON[k] for k in "IOTSZJL"]
+
+class ParticlePool:
+    def __init__(self, capacity=PARTICLE_CAP, colors=PARTICLE_COLORS, seed=None):
+        self.capacity = capacity
+        self.colors = list(colors)
+        self.color_index = {c: i for i, c in enumerate(self.colors)}
+        self.count = 0
+        self.x = np.zeros(capacity, np.float32)
+        self.y = np.zeros(capacity, np.float32)
+        self.vx = np.zeros(capacity, np.float32)
+        self.vy = np.zeros(capacity, np.float32)
+        self.life = np.zeros(capacity, np.int16)
+        self.color = np.zeros(capacity, np.uint8)
+        self.rng = np.random.default_rng(seed)
+        self.sprites = None
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def spawn(self, xs, ys, color):
+        n = min(len(xs), self.capacity - self.count)
+        if n <= 0:
+            return
+        s = slice(self.count, self.count + n)
+        self.x[s] = xs[:n]
+        self.y[s] = ys[:n]
+        self.vx[s] = self.rng.uniform(-2.0, 2.0, n)
+        self.vy[s] = self.rng.uniform(-4.0, -1.0, n)
+        self.life[s] = self.rng.integers(22, 41, n)
+        self.color[s] = self.color_index[color]
+        self.count += n
 
     def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.vy += 0.20
-        self.life -= 1
-
-    def draw(self):
-        if self.life <= 0:
+        n = self.count
+        if not n:
             return
-        a = clamp(self.life * 6, 0, 170)
-        p = pygame.Surface((10, 10), pygame.SRCALPHA)
-        pygame.draw.circle(p, (*self.color, a), (5, 5), 4)
-        screen.blit(p, (self.x, self.y))
-
-JLSTZ_KICKS = {
-    (0, 1): [(0,0), (-1,0), (-1,1), (0,-2), (-1,-2)],
-    (1, 0): [(0,0), (1,0), (1,-1), (0,2), (1,2)],
-    (1, 2): [(0,0), (1,0), (1,-1), (0,2), (1,2)],
-    (2, 1): [(0,0), (-1,0), (-1,1), (0,-2), (-1,-2)],
-    (2, 3): [(0,0), (1,0), (1,1), (0,-2), (1,-2)],
-    (3, 2): [(0,0), (-1,0), (-1,-1), (0,2), (-1,2)],
-    (3, 0): [(0,0), (-1,0), (-1,-1), (0,2), (-1,2)],
-    (0, 3): [(0,0), (1,0), (1,1), (0,-2), (1,-2)],
-}
-I_KICKS = {
-    (0, 1): [(0,0), (-2,0), (1,0), (-2,-1), (1,2)],
-    (1, 0): [(0,0), (2,0), (-1,0), (2,1), (-1,-2)],
-    (1, 2): [(0,0), (-1,0), (2,0), (-1,2), (2,-1)],
-    (2, 1): [(0,0), (1,0), (-2,0), (1,-2), (-2,1)],
-    (2, 3): [(0,0), (2,0), (-1,0), (2,1), (-1,-2)],
-    (3, 2): [(0,0), (-2,0), (1,0), (-2,-1), (1,2)],
-    (3, 0): [(0,0), (1,0), (-2,0), (1,-2), (-2,1)],
-    (0, 3): [(0,0), (-1,0), (2,0), (-1,2), (2,-1)],
-}
-
-def srs_kicks(kind, old_rot, new_rot):
-    if kind == "O":
-        return [(0, 0)]
-    if kind == "I":
-        return I_KICKS.get((old_rot, new_rot), [(0, 0)])
-    return JLSTZ_KICKS.get((old_rot, new_rot), [(0, 0)])
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vy[:n] += 0.20
+        self.life[:n] -= 1
+
+        alive = self.life[:n] > 0
+        keep = int(alive.sum())
+        if keep < n:
+            for arr in (self.x, self.y, self.vx, self.vy, self.life, self.color):
+                arr[:keep] = arr[:n][alive]
+            self.count = keep
+
+    def build_sprites(self):
+        sprites = []
+        for color in self.colors:
+            row = []
+            for bucket in range(170 // PARTICLE_ALPHA_STEP + 1):
+                p = pygame.Surface((10, 10), pygame.SRCALPHA)
+                pygame.draw.circle(p, (*color, bucket * PARTICLE_ALPHA_STEP), (5, 5), 4)
+                row.append(screen.convert(p))
+            sprites.append(row)
+        return sprites
+
+    def draw(self, target=None):
+        n = self.count
+        if not n:
+            return
+        if target is None:
+            target = screen
+        if self.sprites is None:
+            self.sprites = self.build_sprites()
+        buckets = np.minimum(self.life[:n] * 6, 170) // PARTICLE_ALPHA_STEP
+        xs = self.x[:n].astype(np.int32).tolist()
+        ys = self.y[:n].astype(np.int32).tolist()
+        sprites = self.sprites
+        target.blits(
+            [(sprites[c][b], (px, py)) for c, b, px, py in zip(self.color[:n].tolist(), buckets.tolist(), xs, ys)],
+            doreturn=False,
+        )
 
 STATE_MENU = "menu"
 STATE_CONTROLS = "controls"
 STATE_PLAYING = "playing"
+STATE_DEMO = "demo"
+
+MENU_OPTIONS = ["PLAY", "DEMO", "CONTROLS", "QUIT"]
+ATTRACT_IDLE_MS = 30000
+DEMO_THINK_MS = 140
+DEMO_RESTART_MS = 2500
+
+REPLAY_DIR = os.environ.get("TETRIS_REPLAY_DIR")
+CAPTURE_TARGET = os.environ.get("TETRIS_CAPTURE")
+PROFILE_ON_START = bool(os.environ.get("TETRIS_PROFILE"))
+PROFILE_CSV = os.environ.get("TETRIS_PROFILE_CSV")
+PROFILE_FRAMES = int(os.environ.get("TETRIS_PROFILE_FRAMES", "300"))
+PROFILE_REFRESH = 15
+
+def open_replay(seed):
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{seed}.ntr"
+    return ReplayWriter(open(os.path.join(REPLAY_DIR, name), "wb"), seed)
+
+def draw_profiler_overlay(lines):
+    screen.fill_rect((0, 0, 0, 200), (6, 6, 186, 22 + 18 * len(lines)))
+    screen.blit(render_text("phase        p50    p99", FONT, (0, 255, 255)), (12, 10))
+    y = 30
+    for line in lines:
+        screen.blit(render_text(line, FONT, WHITE), (12, y))
+        y += 18
+
+# Static screens block on the event queue and repaint only for these.
+REDRAW_EVENTS = (
+    pygame.KEYDOWN,
+    pygame.VIDEOEXPOSE,
+    pygame.WINDOWEXPOSED,
+    pygame.WINDOWRESTORED,
+    pygame.WINDOWSIZECHANGED,
+)
+IDLE_WAIT_MS = 250
+
+def wait_events(timeout=None):
+    if timeout is None:
+        event = pygame.event.wait()
+    else:
+        event = pygame.event.wait(max(1, timeout))
+    events = [] if event.type == pygame.NOEVENT else [event]
+    events.extend(pygame.event.get())
+    return events
+
+def needs_redraw(events):
+    return any(event.type in REDRAW_EVENTS for event in events)
 
 def draw_menu(selected):
-    screen.fill(BLACK)
-    draw_background_glow()
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 170))
-    screen.blit(overlay, (0, 0))
+    draw_static_layer("menu")
 
     neon_text("TETRIS", BIG_FONT, 90, 70, (0, 255, 255))
     neon_text("Modern Neon Deluxe", MID_FONT, 90, 125, (210, 0, 255))
 
-    options = ["PLAY", "CONTROLS", "QUIT"]
     y = 210
-    for i, opt in enumerate(options):
+    for i, opt in enumerate(MENU_OPTIONS):
         col = (0, 255, 255) if i == selected else (200, 200, 230)
         neon_text(opt, MID_FONT, 120, y, col)
         y += 52
 
     neon_text("Use ↑/↓ then ENTER", FONT, 125, 450, (200, 200, 230))
-    pygame.display.flip()
+    screen.present()
 
 def draw_controls():
-    screen.fill(BLACK)
-    draw_background_glow()
-
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 175))
-    screen.blit(overlay, (0, 0))
+    draw_static_layer("controls")
 
     neon_text("CONTROLS", BIG_FONT, 90, 50, (0, 255, 255))
 
@@ -377,6 +503,7 @@ def draw_controls():
         "C         Hold piece",
         "P         Pause",
         "H         Toggle controls overlay",
+        "F3 / F4   Frame timings / profile",
         "ESC       Menu / Back",
         "",
         "Press BACKSPACE to return",
@@ -384,139 +511,114 @@ def draw_controls():
 
     y = 150
     for line in lines:
-        screen.blit(FONT.render(line, True, WHITE), (70, y))
+        screen.blit(render_text(line, FONT, WHITE), (70, y))
         y += 28
 
-    pygame.display.flip()
-
-def run_game():
-    board = empty_board()
-    particles = []
-
-    bag = new_bag()
-    next_queue = []
-    while len(next_queue) < 6:
-        if not bag:
-            bag = new_bag()
-        next_queue.append(bag.pop())
+    screen.present()
 
-    current = spawn_piece(next_queue.pop(0))
-    if not bag:
-        bag = new_bag()
-    next_queue.append(bag.pop())
-
-    hold = None
-    can_hold = True
-
-    score = 0
-    level = 1
-    total_lines = 0
-    combo = 0
-    b2b = False
+KEY_ACTIONS = {
+    pygame.K_LEFT: ACTION_LEFT,
+    pygame.K_RIGHT: ACTION_RIGHT,
+    pygame.K_DOWN: ACTION_SOFT_DROP_ON,
+    pygame.K_UP: ACTION_ROTATE_CW,
+    pygame.K_z: ACTION_ROTATE_CCW,
+    pygame.K_SPACE: ACTION_HARD_DROP,
+    pygame.K_c: ACTION_HOLD,
+}
+# Handed to Controls, which repeats shifts and times soft drop itself.
+HELD_ACTIONS = (ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP_ON)
+
+def apply_clear_effect(particles, lines_):
+    rng = particles.rng
+    px = rng.integers(10, COLS * CELL - 10, 55, endpoint=True)
+    py = rng.choice(lines_, 55) * CELL + rng.integers(0, CELL, 55, endpoint=True)
+    particles.spawn(px, py, (0, 255, 255))
+
+def run_game(demo=False):
+    init_display()
+    game = GameState()
+    particles = ParticlePool(seed=game.seed)
+    recorder = open_replay(game.seed) if REPLAY_DIR and not demo else None
+
+    capture = open_capture(CAPTURE_TARGET, screen.snapshot()) if CAPTURE_TARGET else None
+
+    def finish(result):
+        if recorder is not None:
+            recorder.close()
+        if capture is not None:
+            capture.close()
+        if profiler.capture is not None:
+            profiler.finish_capture()
+        if PROFILE_CSV and profiler.frames:
+            profiler.export_csv(PROFILE_CSV)
+        if keep_profiling and latency.least:
+            print(latency.summary(), file=sys.stderr)
+        return result
+
+    def apply(action):
+        moved = game.step(action)
+        # Held against a wall a shift keeps failing; those change nothing
+        # and are left out of the replay.
+        if recorder is not None and (moved or action not in (ACTION_LEFT, ACTION_RIGHT)):
+            recorder.action(action)
+        return moved
+
+    bot = Bot() if demo else None
+    controls = Controls(apply)
+    latency = InputLatency()
+    profiler = FrameProfiler()
+    keep_profiling = PROFILE_ON_START or PROFILE_CSV
+    if keep_profiling:
+        profiler.start()
+    show_profiler = False
+    profiler_lines = []
+    think_timer = 0
+    over_timer = 0
+    lag = 0
+    particle_lag = 0
 
-    fall_timer = 0
-    soft_drop = False
     paused = False
 
     flash_lines = []
     flash_timer = 0
 
     show_controls_overlay = False
-
-    def try_rotate(dir_):
-        nonlocal current
-        old_rot = current.rot
-        new_rot = (current.rot + dir_) % 4
-        rotated = Piece(current.kind, current.x, current.y, new_rot)
-        if valid(rotated, board):
-            current = rotated
-            return True
-        for dx, dy in srs_kicks(current.kind, old_rot, new_rot):
-            kicked = Piece(current.kind, current.x + dx, current.y + dy, new_rot)
-            if valid(kicked, board):
-                current = kicked
-                return True
-        return False
-
-    def try_move(dx, dy):
-        nonlocal current
-        moved = Piece(current.kind, current.x + dx, current.y + dy, current.rot)
-        if valid(moved, board):
-            current = moved
-            return True
-        return False
-
-    def spawn_next():
-        nonlocal current, next_queue, bag
-        current = spawn_piece(next_queue.pop(0))
-        if not bag:
-            bag = new_bag()
-        next_queue.append(bag.pop())
-        return valid(current, board)
-
-    def apply_clear_effect(lines_):
-        for _ in range(55):
-            px = random.randint(10, COLS * CELL - 10)
-            py = random.choice(lines_) * CELL + random.randint(0, CELL)
-            particles.append(Particle(px, py, (0, 255, 255)))
-
-    def handle_line_clear(cleared, lines_cleared):
-        nonlocal score, combo, b2b, total_lines, level, flash_lines, flash_timer
-        if cleared > 0:
-            combo += 1
-            total_lines += cleared
-            level = 1 + total_lines // 10
-
-            base_points = scoring_for_lines(cleared, level)
-            combo_bonus = 50 * (combo - 1) * level if combo > 1 else 0
-
-            if is_tetris(cleared):
-                if b2b:
-                    base_points = int(base_points * 1.5)
-                b2b = True
-            else:
-                b2b = False
-
-            score += base_points + combo_bonus
-
-            flash_lines = lines_cleared[:]
-            flash_timer = 130
-            apply_clear_effect(lines_cleared)
-        else:
-            combo = 0
-
-    def hard_drop():
-        nonlocal current, score, can_hold
-        drop_y = get_drop_y(current, board)
-        distance = drop_y - current.y
-        current.y = drop_y
-        score += distance * 2
-
-        if any(y < 0 for _, y in current.cells()):
-            return False
-
-        lock_piece(current, board)
-        board2, cleared, lines_cleared = clear_lines(board)
-        board[:] = board2
-        handle_line_clear(cleared, lines_cleared)
-
-        can_hold = True
-        ok = spawn_next()
-        return ok
-
-    game_over = False
+    idle = False
 
     while True:
-        dt = clock.tick(60)
-        fall_timer += dt
-
-        for event in pygame.event.get():
+        # Paused, game-over and help screens sit still once particles and
+        # flashes have run out, so wait for input instead of redrawing.
+        if idle:
+            events = wait_events(IDLE_WAIT_MS)
+            dt = clock.tick(FRAME_CAP)
+        else:
+            # Sleep before reading input, so keys pressed meanwhile make
+            # this frame rather than the next.
+            dt = clock.tick(FRAME_CAP)
+            events = pygame.event.get()
+        latency.polled()
+        logic_dt = 0 if idle else dt
+        profiler.begin_frame()
+
+        for event in events:
             if event.type == pygame.QUIT:
-                return "quit"
+                return finish("quit")
 
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    return "menu"
+                if event.key == pygame.K_F3:
+                    show_profiler = not show_profiler
+                    if show_profiler:
+                        profiler.start()
+                    elif not keep_profiling:
+                        profiler.stop()
+                    continue
+
+                if event.key == pygame.K_F4:
+                    profiler.capture_frames(PROFILE_FRAMES, f"tetris-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+                    continue
+
+                if event.key == pygame.K_ESCAPE or demo:
+                    return finish("menu")
 
                 if event.key == pygame.K_h:
                     show_controls_overlay = not show_controls_overlay
@@ -524,97 +626,94 @@ def run_game():
                 if event.key == pygame.K_p:
                     paused = not paused
 
-                if game_over:
+                if game.game_over:
                     if event.key == pygame.K_r:
-                        return "restart"
+                        return finish("restart")
                     continue
 
                 if paused or show_controls_overlay:
                     continue
 
-                if event.key == pygame.K_LEFT:
-                    try_move(-1, 0)
-                elif event.key == pygame.K_RIGHT:
-                    try_move(1, 0)
-                elif event.key == pygame.K_DOWN:
-                    soft_drop = True
-                elif event.key == pygame.K_UP:
-                    try_rotate(1)
-                elif event.key == pygame.K_z:
-                    try_rotate(-1)
-                elif event.key == pygame.K_SPACE:
-                    ok = hard_drop()
-                    if not ok:
-                        game_over = True
-                elif event.key == pygame.K_c:
-                    if can_hold:
-                        can_hold = False
-                        if hold is None:
-                            hold = current.kind
-                            ok = spawn_next()
-                            if not ok:
-                                game_over = True
-                        else:
-                            hold, current.kind = current.kind, hold
-                            current.x, current.y, current.rot = 3, -2, 0
-                            if not valid(current, board):
-                                game_over = True
+                action = KEY_ACTIONS.get(event.key)
+                if action is not None:
+                    latency.key()
+                    if action in HELD_ACTIONS:
+                        controls.press(action)
+                    else:
+                        apply(action)
 
             if event.type == pygame.KEYUP:
-                if event.key == pygame.K_DOWN:
-                    soft_drop = False
-
-        if not paused and not game_over and not show_controls_overlay:
-            speed = fall_speed_ms(level)
-            if soft_drop:
-                speed = max(30, speed // 10)
-
-            if fall_timer >= speed:
-                fall_timer = 0
-                if not try_move(0, 1):
-                    if any(y < 0 for _, y in current.cells()):
-                        game_over = True
-                    else:
-                        lock_piece(current, board)
-                        board2, cleared, lines_cleared = clear_lines(board)
-                        board[:] = board2
-                        handle_line_clear(cleared, lines_cleared)
-                        can_hold = True
-                        ok = spawn_next()
-                        if not ok:
-                            game_over = True
-
-        screen.fill(BLACK)
-        draw_background_glow()
-        draw_glass_playfield()
-        draw_grid()
-        draw_board(board)
+                action = KEY_ACTIONS.get(event.key)
+                if action in HELD_ACTIONS:
+                    controls.release(action)
+
+        profiler.mark("events")
+
+        if not paused and not game.game_over and not show_controls_overlay:
+            lag = min(lag + logic_dt, MAX_FRAME_MS)
+            while lag >= LOGIC_TICK_MS and not game.game_over:
+                controls.update(LOGIC_TICK_MS, game)
+                if recorder is not None:
+                    recorder.tick(LOGIC_TICK_MS)
+                game.tick(LOGIC_TICK_MS)
+                lag -= LOGIC_TICK_MS
+            if bot is not None:
+                think_timer += logic_dt
+                if think_timer >= DEMO_THINK_MS:
+                    think_timer = 0
+                    for action in bot.plan(game):
+                        game.step(action)
+
+        if demo and game.game_over:
+            over_timer += dt
+            if over_timer >= DEMO_RESTART_MS:
+                return finish("demo")
+
+        if idle and not needs_redraw(events):
+            continue
+
+        for lines_cleared in game.pop_clear_events():
+            flash_lines = lines_cleared
+            flash_timer = 130
+            apply_clear_effect(particles, lines_cleared)
+        profiler.mark("logic")
+
+        draw_static_layer("play")
+        profiler.mark("background")
+
+        draw_board(game.board)
 
         if flash_timer > 0 and flash_lines:
             flash_timer -= dt
-            flash = pygame.Surface((COLS * CELL, CELL), pygame.SRCALPHA)
-            flash.fill((255, 255, 255, 110))
             for ly in flash_lines:
-                screen.blit(flash, (0, ly * CELL))
+                screen.fill_rect((255, 255, 255, 110), (0, ly * CELL, COLS * CELL, CELL))
 
-        for p in particles[:]:
-            p.update()
-            p.draw()
-            if p.life <= 0:
-                particles.remove(p)
+        profiler.mark("board")
 
-        if not game_over:
-            ghost_y = get_drop_y(current, board)
+        particle_lag = min(particle_lag + dt, MAX_FRAME_MS)
+        while particle_lag >= PARTICLE_STEP_MS:
+            particles.update()
+            particle_lag -= PARTICLE_STEP_MS
+        particles.draw()
+        profiler.mark("particles")
+
+        current = game.current
+        if not game.game_over:
+            ghost_y = game.ghost_y()
             ghost = Piece(current.kind, current.x, ghost_y, current.rot)
             draw_piece(ghost, NEON["GHOST"], alpha=55)
-            draw_piece(current, NEON[current.kind])
+            # Slide the piece toward the next row by the share of the
+            # gravity interval already spent.
+            fall = 0
+            if ghost_y > current.y and not paused:
+                fall = min(CELL - 1, CELL * (game.fall_timer + lag) // game.gravity_ms())
+            draw_piece(current, NEON[current.kind], offset=fall)
+        profiler.mark("board")
 
-        draw_panel(score, level, total_lines, hold, next_queue, paused, combo, b2b)
+        draw_panel(game.score, game.level, game.total_lines, game.hold, game.next_queue, paused, game.combo, game.b2b)
 
         if show_controls_overlay:
-            overlay = pygame.Surface((COLS * CELL, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 185))
-            screen.blit(overlay, (0, 0))
+            screen.fill_rect((0, 0, 0, 185), (0, 0, COLS * CELL, HEIGHT))
             neon_text("CONTROLS", BIG_FONT, 35, 50, (0, 255, 255))
             lines = [
                 "←/→ Move",
@@ -629,54 +728,149 @@ def run_game():
             ]
             y = 135
             for line in lines:
-                screen.blit(MID_FONT.render(line, True, WHITE), (50, y))
+                screen.blit(render_text(line, MID_FONT, WHITE), (50, y))
                 y += 34
 
-        if game_over:
-            overlay = pygame.Surface((COLS * CELL, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 190))
-            screen.blit(overlay, (0, 0))
+        if game.game_over:
+            screen.fill_rect((0, 0, 0, 190), (0, 0, COLS * CELL, HEIGHT))
             neon_text("GAME OVER", BIG_FONT, 35, HEIGHT // 2 - 80, (255, 60, 120))
-            screen.blit(FONT.render("Press R to Restart", True, WHITE), (52, HEIGHT // 2 - 10))
-            screen.blit(FONT.render("ESC to Menu", True, WHITE), (78, HEIGHT // 2 + 18))
+            if not demo:
+                screen.blit(render_text("Press R to Restart", FONT, WHITE), (52, HEIGHT // 2 - 10))
+                screen.blit(render_text("ESC to Menu", FONT, WHITE), (78, HEIGHT // 2 + 18))
+
+        if demo:
+            neon_text("DEMO", MID_FONT, 14, HEIGHT - 38, (210, 0, 255))
+            screen.blit(render_text("Press any key", FONT, WHITE), (COLS * CELL - 150, HEIGHT - 34))
+
+        if show_profiler:
+            if profiler.frames % PROFILE_REFRESH == 0 or not profiler_lines:
+                profiler_lines = [f"{phase:<10} {p50:6.2f} {p99:6.2f}" for phase, p50, p99 in profiler.stats()]
+                p50_lo, p50_hi, p99_lo, p99_hi = latency.stats()
+                profiler_lines.append(f"{'input lo':<10} {p50_lo:6.2f} {p99_lo:6.2f}")
+                profiler_lines.append(f"{'input hi':<10} {p50_hi:6.2f} {p99_hi:6.2f}")
+            draw_profiler_overlay(profiler_lines)
+        profiler.mark("panel")
+
+        if capture is not None:
+            capture.grab(screen.snapshot())
+        screen.present()
+        latency.presented()
+        profiler.mark("flip")
+        profiler.end_frame()
+
+        idle = (
+            (paused or game.game_over or show_controls_overlay)
+            and not len(particles)
+            and flash_timer <= 0
+            and not show_profiler
+            and capture is None
+        )
 
-        pygame.display.flip()
+def export_replay(path, target, fps=60):
+    # Renders a replay as fast as it will go, one video frame per 1/fps
+    # seconds of game time, and streams the frames to `target`.
+    init_display()
+    with open(path, "rb") as f:
+        player = ReplayPlayer(f)
+        game = player.state
+        particles = ParticlePool(seed=game.seed)
+        capture = open_capture(target, screen.snapshot())
+        frame_ms = 1000 / fps
+        game_ms = 0
+        video_ms = 0
+        particle_lag = 0
+        start = time.perf_counter()
+        running = True
+        while running:
+            video_ms += frame_ms
+            while game_ms < video_ms:
+                if not player.step_frame():
+                    running = False
+                    break
+                game_ms += player.tick_ms
+
+            for lines_cleared in game.pop_clear_events():
+                apply_clear_effect(particles, lines_cleared)
+            draw_static_layer("play")
+            draw_board(game.board)
+            particle_lag += frame_ms
+            while particle_lag >= PARTICLE_STEP_MS:
+                particles.update()
+                particle_lag -= PARTICLE_STEP_MS
+            particles.draw()
+            if not game.game_over:
+                current = game.current
+                ghost = Piece(current.kind, current.x, game.ghost_y(), current.rot)
+                draw_piece(ghost, NEON["GHOST"], alpha=55)
+                draw_piece(current, NEON[current.kind])
+            draw_panel(game.score, game.level, game.total_lines, game.hold, game.next_queue, False, game.combo, game.b2b)
+            capture.grab(screen.snapshot(), wait=True)
+        capture.close()
+    elapsed = time.perf_counter() - start
+    return capture.frames, elapsed
+
+def export_main(argv=None):
+    parser = argparse.ArgumentParser(prog="Tetris.py export", description="Render a replay to video frames.")
+    parser.add_argument("replay", help="replay file to render")
+    parser.add_argument("target", help='output path, "-" for stdout, "|command" to pipe, or a .ring file')
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args(argv)
+    frames, elapsed = export_replay(args.replay, args.target, args.fps)
+    print(f"{frames} frames in {elapsed:.2f}s, {frames / args.fps / elapsed:.1f}x real time", file=sys.stderr)
 
 def main():
+    init_display()
     state = STATE_MENU
     menu_selected = 0
+    last_input = pygame.time.get_ticks()
+    redraw = True
 
     while True:
         if state == STATE_MENU:
-            draw_menu(menu_selected)
+            if redraw:
+                draw_menu(menu_selected)
+            events = wait_events(ATTRACT_IDLE_MS - (pygame.time.get_ticks() - last_input))
+            redraw = needs_redraw(events)
 
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
 
                 if event.type == pygame.KEYDOWN:
+                    last_input = pygame.time.get_ticks()
+
                     if event.key == pygame.K_ESCAPE:
                         pygame.quit()
                         sys.exit()
 
                     if event.key == pygame.K_UP:
-                        menu_selected = (menu_selected - 1) % 3
+                        menu_selected = (menu_selected - 1) % len(MENU_OPTIONS)
                     elif event.key == pygame.K_DOWN:
-                        menu_selected = (menu_selected + 1) % 3
+                        menu_selected = (menu_selected + 1) % len(MENU_OPTIONS)
 
                     elif event.key == pygame.K_RETURN:
-                        if menu_selected == 0:
+                        option = MENU_OPTIONS[menu_selected]
+                        if option == "PLAY":
                             state = STATE_PLAYING
-                        elif menu_selected == 1:
+                        elif option == "DEMO":
+                            state = STATE_DEMO
+                        elif option == "CONTROLS":
                             state = STATE_CONTROLS
-                        elif menu_selected == 2:
+                        elif option == "QUIT":
                             pygame.quit()
                             sys.exit()
 
+            if state == STATE_MENU and pygame.time.get_ticks() - last_input >= ATTRACT_IDLE_MS:
+                state = STATE_DEMO
+
         elif state == STATE_CONTROLS:
-            draw_controls()
-            for event in pygame.event.get():
+            if redraw:
+                draw_controls()
+            events = wait_events()
+            redraw = needs_redraw(events)
+
+            for event in events:
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
@@ -693,7 +887,29 @@ def main():
                 state = STATE_PLAYING
             else:
                 state = STATE_MENU
+                redraw = True
+
+        elif state == STATE_DEMO:
+            result = run_game(demo=True)
+            if result == "quit":
+                pygame.quit()
+                sys.exit()
+            if result == "demo":
+                state = STATE_DEMO
+            else:
+                state = STATE_MENU
+                redraw = True
+                last_input = pygame.time.get_ticks()
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["tournament"]:
+        from tournament import main as tournament_main
+        tournament_main(sys.argv[2:])
+    elif sys.argv[1:2] == ["botserver"]:
+        from botserver import main as botserver_main
+        botserver_main(sys.argv[2:])
+    elif sys.argv[1:2] == ["export"]:
+        export_main(sys.argv[2:])
+    else:
+        main()
 
@@ -0,0 +1,146 @@
+import warnings
+import weakref
+
+import pygame
+
+# Both backends take the same calls from the draw_* functions in
+# Tetris.py: blit()/blits() of prepared surfaces, fill_rect() and line()
+# for the few shapes drawn straight to the frame, then present().
+
+class SurfaceBackend:
+    # Software blits onto the display surface, scaled up by SDL.
+    name = "surface"
+
+    def __init__(self, title, size):
+        # Without a GPU pygame only warns "no fast renderer available" and
+        # SDL still reports vsync, but nothing waits for the display.
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                self.surface = pygame.display.set_mode(size, pygame.SCALED, vsync=1)
+            self.vsync = not caught
+        except pygame.error:
+            self.surface = pygame.display.set_mode(size, pygame.SCALED)
+            self.vsync = False
+        pygame.display.set_caption(title)
+        self.blit = self.surface.blit
+        self.blits = self.surface.blits
+        self.get_size = self.surface.get_size
+        self.tints = {}
+
+    def convert(self, surface, alpha=True):
+        return surface.convert_alpha() if alpha else surface.convert()
+
+    def fill_rect(self, color, rect):
+        rect = pygame.Rect(rect)
+        if len(color) == 4:
+            key = (rect.size, tuple(color))
+            tint = self.tints.get(key)
+            if tint is None:
+                tint = self.tints[key] = pygame.Surface(rect.size, pygame.SRCALPHA)
+                tint.fill(color)
+            self.surface.blit(tint, rect.topleft)
+        else:
+            self.surface.fill(color, rect)
+
+    def line(self, color, start, end, width=1):
+        pygame.draw.line(self.surface, color, start, end, width)
+
+    def snapshot(self):
+        return self.surface
+
+    def present(self):
+        pygame.display.flip()
+
+class TextureBackend:
+    # Draws through an SDL renderer. Every surface handed to blit() is
+    # uploaded once and its texture reused for as long as the surface
+    # lives, so a frame is a list of texture copies. Falls back to SDL's
+    # software renderer where there is no GPU.
+    name = "texture"
+
+    def __init__(self, title, size):
+        from pygame._sdl2.video import Renderer, Texture, Window, error
+
+        self.window = Window(title, size, resizable=True)
+        self.renderer = None
+        # SDL's software renderer accepts vsync but never waits on it.
+        for accelerated, vsync in ((1, True), (1, False), (0, False)):
+            try:
+                self.renderer = Renderer(self.window, accelerated=accelerated, vsync=vsync)
+            except error:
+                continue
+            self.vsync = vsync
+            break
+        if self.renderer is None:
+            raise error("no SDL renderer available")
+        self.renderer.logical_size = size
+        self.renderer.draw_blend_mode = pygame.BLENDMODE_BLEND
+        self.size = size
+        self.from_surface = Texture.from_surface
+        self.textures = weakref.WeakKeyDictionary()
+
+    def get_size(self):
+        return self.size
+
+    def convert(self, surface, alpha=True):
+        # Pixel format only matters for the upload, which SDL converts.
+        return surface
+
+    def texture(self, surface):
+        texture = self.textures.get(surface)
+        if texture is None:
+            # SDL has no empty textures; a blank pixel draws the same.
+            upload = surface if surface.get_width() and surface.get_height() else pygame.Surface((1, 1), pygame.SRCALPHA)
+            texture = self.textures[surface] = self.from_surface(self.renderer, upload)
+        return texture
+
+    def blit(self, surface, pos):
+        self.texture(surface).draw(dstrect=pos)
+
+    def blits(self, pairs, doreturn=False):
+        # Batches reuse a handful of sprites, so look each up only once
+        # rather than through the weak mapping every time.
+        seen = {}
+        for surface, pos in pairs:
+            texture = seen.get(surface)
+            if texture is None:
+                texture = seen[surface] = self.texture(surface)
+            texture.draw(dstrect=pos)
+
+    def fill_rect(self, color, rect):
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.fill_rect(rect)
+
+    def line(self, color, start, end, width=1):
+        self.renderer.draw_color = pygame.Color(color)
+        if width == 1:
+            self.renderer.draw_line(start, end)
+            return
+        # Only straight lines are drawn wider than a pixel.
+        (x0, y0), (x1, y1) = start, end
+        half = width // 2
+        if x0 == x1:
+            self.renderer.fill_rect((x0 - half, min(y0, y1), width, abs(y1 - y0) + 1))
+        else:
+            self.renderer.fill_rect((min(x0, x1), y0 - half, abs(x1 - x0) + 1, width))
+
+    def snapshot(self):
+        # Must be read before present(), which leaves the back buffer
+        # undefined.
+        return self.renderer.to_surface()
+
+    def present(self):
+        self.renderer.present()
+
+BACKENDS = {
+    "surface": SurfaceBackend,
+    "texture": TextureBackend,
+}
+
+def open_backend(name, title, size):
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown renderer {name!r}, expected one of {', '.join(BACKENDS)}") from None
+    return backend(title, size)
@@ -0,0 +1,460 @@
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from engine import (
+    ROWS,
+    SHAPES,
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_DOWN,
+    ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW,
+    ACTION_HARD_DROP,
+    ACTION_HOLD,
+    ACTION_SOFT_DROP_ON,
+    ACTION_SOFT_DROP_OFF,
+    ACTIONS,
+    FULL_ROW,
+    KICK_TABLE,
+    PIECE_TABLE,
+    GameState,
+    Piece,
+    fall_speed_ms,
+    is_tetris,
+    scoring_for_lines,
+    valid,
+)
+
+# Rows are uint16 with the playfield in bits 3..12 and three wall bits on
+# either side, so a piece pushed past a wall collides like it hits a block.
+WALL = 3
+WALLS = ((1 << 16) - 1) & ~(FULL_ROW << WALL)
+SOLID = (1 << 16) - 1
+TOP = 6
+FLOOR = 4
+HEIGHT = TOP + ROWS + FLOOR
+
+KINDS = tuple(SHAPES)
+
+X_MIN = -WALL
+X_SPAN = 16
+QUEUE_CAP = 14
+
+def build_masks():
+    masks = np.full((len(KINDS), 4, X_SPAN, 4), SOLID, np.uint16)
+    top = np.zeros((len(KINDS), 4), np.int64)
+    for k, kind in enumerate(KINDS):
+        for rot in range(4):
+            shape = PIECE_TABLE[kind][rot]
+            top[k, rot] = shape.top
+            for xi in range(X_SPAN):
+                x = X_MIN + xi
+                bits = [0, 0, 0, 0]
+                inside = True
+                for cx, cy in shape.offsets:
+                    col = x + cx + WALL
+                    if not 0 <= col < 16:
+                        inside = False
+                        break
+                    bits[cy] |= 1 << col
+                if inside:
+                    masks[k, rot, xi] = bits
+    return masks, top
+
+def build_kicks():
+    kicks = np.zeros((len(KINDS), 4, 2, 5, 2), np.int64)
+    for k, kind in enumerate(KINDS):
+        for rot in range(4):
+            for d, dir_ in enumerate((1, -1)):
+                offsets = list(KICK_TABLE[kind, rot, (rot + dir_) % 4])
+                offsets += [offsets[0]] * (5 - len(offsets))
+                kicks[k, rot, d] = offsets
+    return kicks
+
+def build_fall_speeds():
+    speeds = [fall_speed_ms(level) for level in range(1, 65)]
+    if fall_speed_ms(64) != fall_speed_ms(128):
+        raise ValueError("fall_speed_ms() has not settled by level 64")
+    return np.array([speeds[0]] + speeds, np.int64)
+
+MASKS, PIECE_TOP = build_masks()
+KICKS = build_kicks()
+FALL_SPEEDS = build_fall_speeds()
+DY = np.arange(4)
+ROW_INDEX = np.arange(ROWS)
+
+class BatchGame:
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.cells = np.full((n, HEIGHT), WALLS, np.uint16)
+        self.cells[:, TOP + ROWS:] = SOLID
+
+        self.queue = np.zeros((n, QUEUE_CAP), np.int64)
+        self.queue_len = np.zeros(n, np.int64)
+        everyone = np.arange(n)
+        self.refill(everyone)
+        self.refill(everyone)
+
+        self.kind = np.zeros(n, np.int64)
+        self.rot = np.zeros(n, np.int64)
+        self.x = np.zeros(n, np.int64)
+        self.y = np.zeros(n, np.int64)
+        self.take_next(everyone)
+
+        self.hold = np.full(n, -1, np.int64)
+        self.can_hold = np.ones(n, bool)
+
+        self.score = np.zeros(n, np.int64)
+        self.level = np.ones(n, np.int64)
+        self.total_lines = np.zeros(n, np.int64)
+        self.combo = np.zeros(n, np.int64)
+        self.b2b = np.zeros(n, bool)
+
+        self.fall_timer = np.zeros(n, np.int64)
+        self.soft_drop = np.zeros(n, bool)
+        self.game_over = np.zeros(n, bool)
+        self.pieces_placed = np.zeros(n, np.int64)
+
+    @property
+    def boards(self):
+        return (self.cells[:, TOP:TOP + ROWS] >> WALL) & FULL_ROW
+
+    @property
+    def next_queue(self):
+        return self.queue[:, :6]
+
+    def active(self):
+        return np.flatnonzero(~self.game_over)
+
+    def refill(self, idx):
+        idx = idx[self.queue_len[idx] < 7]
+        if not len(idx):
+            return
+        bags = self.rng.permuted(np.tile(np.arange(len(KINDS)), (len(idx), 1)), axis=1)
+        cols = self.queue_len[idx, None] + np.arange(len(KINDS))
+        self.queue[idx[:, None], cols] = bags
+        self.queue_len[idx] += len(KINDS)
+
+    def take_next(self, idx):
+        self.kind[idx] = self.queue[idx, 0]
+        self.queue[idx, :-1] = self.queue[idx, 1:]
+        self.queue_len[idx] -= 1
+        self.refill(idx)
+        self.reset_pose(idx)
+
+    def reset_pose(self, idx):
+        self.rot[idx] = 0
+        self.x[idx] = 3
+        self.y[idx] = -2
+
+    def fits(self, idx, kind, rot, x, y):
+        masks = MASKS[kind, rot, np.clip(x - X_MIN, 0, X_SPAN - 1)]
+        rows = np.clip(y + TOP, 0, HEIGHT - 4)[:, None] + DY
+        return ~(self.cells[idx[:, None], rows] & masks).any(1)
+
+    def spawn_next(self, idx):
+        self.take_next(idx)
+        ok = self.fits(idx, self.kind[idx], self.rot[idx], self.x[idx], self.y[idx])
+        self.game_over[idx[~ok]] = True
+
+    def move(self, idx, dx, dy):
+        ok = self.fits(idx, self.kind[idx], self.rot[idx], self.x[idx] + dx, self.y[idx] + dy)
+        moved = idx[ok]
+        self.x[moved] += dx
+        self.y[moved] += dy
+        return ok
+
+    def rotate(self, idx, dir_):
+        kind, rot, x, y = self.kind[idx], self.rot[idx], self.x[idx], self.y[idx]
+        new_rot = (rot + dir_) % 4
+        kicks = KICKS[kind, rot, 0 if dir_ == 1 else 1]
+        done = np.zeros(len(idx), bool)
+        for k in range(kicks.shape[1]):
+            dx, dy = kicks[:, k, 0], kicks[:, k, 1]
+            ok = ~done & self.fits(idx, kind, new_rot, x + dx, y + dy)
+            hit = idx[ok]
+            self.x[hit] += dx[ok]
+            self.y[hit] += dy[ok]
+            self.rot[hit] = new_rot[ok]
+            done |= ok
+        return done
+
+    def drop_y(self, idx):
+        kind, rot, x, y = self.kind[idx], self.rot[idx], self.x[idx], self.y[idx]
+        masks = MASKS[kind, rot, np.clip(x - X_MIN, 0, X_SPAN - 1)]
+        windows = sliding_window_view(self.cells[idx], 4, axis=1)
+        hits = (windows & masks[:, None, :]).any(2)
+        hits &= np.arange(HEIGHT - 3) > (y + TOP)[:, None]
+        return hits.argmax(1) - 1 - TOP
+
+    def lock(self, idx):
+        topped = self.y[idx] + PIECE_TOP[self.kind[idx], self.rot[idx]] < 0
+        self.game_over[idx[topped]] = True
+        idx = idx[~topped]
+        if not len(idx):
+            return
+
+        kind, rot, x, y = self.kind[idx], self.rot[idx], self.x[idx], self.y[idx]
+        masks = MASKS[kind, rot, x - X_MIN]
+        rows = (y + TOP)[:, None] + DY
+        self.cells[idx[:, None], rows] |= masks
+        self.clear_lines(idx)
+        self.pieces_placed[idx] += 1
+
+        self.can_hold[idx] = True
+        self.spawn_next(idx)
+
+    def clear_lines(self, idx):
+        play = self.cells[idx, TOP:TOP + ROWS]
+        full = play == SOLID
+        cleared = full.sum(1)
+
+        hit = cleared > 0
+        self.combo[idx[~hit]] = 0
+        if not hit.any():
+            return
+        idx, play, full, cleared = idx[hit], play[hit], full[hit], cleared[hit]
+
+        order = np.argsort(~full, axis=1, kind="stable")
+        play = np.take_along_axis(play, order, 1)
+        play[ROW_INDEX < cleared[:, None]] = WALLS
+        self.cells[idx, TOP:TOP + ROWS] = play
+
+        self.combo[idx] += 1
+        self.total_lines[idx] += cleared
+        self.level[idx] = 1 + self.total_lines[idx] // 10
+        level = self.level[idx]
+
+        base = np.array([scoring_for_lines(c, lv) for c, lv in zip(cleared.tolist(), level.tolist())], np.int64)
+        combo = self.combo[idx]
+        combo_bonus = np.where(combo > 1, 50 * (combo - 1) * level, 0)
+
+        tetris = np.array([is_tetris(c) for c in cleared.tolist()], bool)
+        bonus = tetris & self.b2b[idx]
+        base[bonus] = (base[bonus] * 3) // 2
+        self.b2b[idx] = tetris
+
+        self.score[idx] += base + combo_bonus
+
+    def hard_drop(self, idx):
+        drop = self.drop_y(idx)
+        self.score[idx] += (drop - self.y[idx]) * 2
+        self.y[idx] = drop
+        self.lock(idx)
+
+    def hold_piece(self, idx):
+        idx = idx[self.can_hold[idx]]
+        self.can_hold[idx] = False
+
+        empty = self.hold[idx] < 0
+        first = idx[empty]
+        self.hold[first] = self.kind[first]
+        self.spawn_next(first)
+
+        swap = idx[~empty]
+        self.hold[swap], self.kind[swap] = self.kind[swap], self.hold[swap]
+        self.reset_pose(swap)
+        ok = self.fits(swap, self.kind[swap], self.rot[swap], self.x[swap], self.y[swap])
+        self.game_over[swap[~ok]] = True
+
+    def gravity_step(self, idx):
+        ok = self.move(idx, 0, 1)
+        self.lock(idx[~ok])
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        live = ~self.game_over
+        for code, action in enumerate(ACTIONS):
+            idx = np.flatnonzero(live & (actions == code))
+            if not len(idx):
+                continue
+            if action == ACTION_LEFT:
+                self.move(idx, -1, 0)
+            elif action == ACTION_RIGHT:
+                self.move(idx, 1, 0)
+            elif action == ACTION_DOWN:
+                self.gravity_step(idx)
+            elif action == ACTION_ROTATE_CW:
+                self.rotate(idx, 1)
+            elif action == ACTION_ROTATE_CCW:
+                self.rotate(idx, -1)
+            elif action == ACTION_HARD_DROP:
+                self.hard_drop(idx)
+            elif action == ACTION_HOLD:
+                self.hold_piece(idx)
+            elif action == ACTION_SOFT_DROP_ON:
+                self.soft_drop[idx] = True
+            elif action == ACTION_SOFT_DROP_OFF:
+                self.soft_drop[idx] = False
+
+    def gravity_ms(self, idx):
+        speed = FALL_SPEEDS[np.minimum(self.level[idx], len(FALL_SPEEDS) - 1)]
+        soft = self.soft_drop[idx]
+        speed[soft] = np.maximum(30, speed[soft] // 10)
+        return speed
+
+    def tick(self, ms):
+        idx = self.active()
+        self.fall_timer[idx] += ms
+        while len(idx):
+            speed = self.gravity_ms(idx)
+            due = self.fall_timer[idx] >= speed
+            idx = idx[due]
+            self.fall_timer[idx] -= speed[due]
+            moved = self.move(idx, 0, 1)
+            landed = idx[~moved]
+            self.fall_timer[landed] = 0
+            self.lock(landed)
+            idx = idx[moved]
+
+    def place(self, rot, x):
+        # Rotate and shift at spawn height, then hard drop. A target that
+        # does not fit at spawn height tops the game out.
+        idx = self.active()
+        rot, x = np.asarray(rot)[idx], np.asarray(x)[idx]
+        ok = self.fits(idx, self.kind[idx], rot, x, self.y[idx])
+        self.game_over[idx[~ok]] = True
+        idx, rot, x = idx[ok], rot[ok], x[ok]
+        self.rot[idx] = rot
+        self.x[idx] = x
+        self.hard_drop(idx)
+
+    def random_placements(self):
+        rot = self.rng.integers(0, 4, self.n)
+        lo = np.array([[PIECE_TABLE[k][r].x_lo for r in range(4)] for k in KINDS])
+        hi = np.array([[PIECE_TABLE[k][r].x_hi for r in range(4)] for k in KINDS])
+        x = self.rng.integers(lo[self.kind, rot], hi[self.kind, rot] + 1)
+        return rot, x
+
+    def greedy_placements(self):
+        # Most lines cleared, then lowest landing row.
+        everyone = np.arange(self.n)
+        best = np.full(self.n, -1 << 30)
+        best_rot = np.zeros(self.n, np.int64)
+        best_x = np.full(self.n, 3)
+        saved = self.rot.copy(), self.x.copy()
+        for rot in range(4):
+            for x in range(X_MIN, X_MIN + X_SPAN):
+                self.rot[:] = rot
+                self.x[:] = x
+                ok = self.fits(everyone, self.kind, self.rot, self.x, self.y)
+                drop = self.drop_y(everyone)
+                masks = MASKS[self.kind, rot, x - X_MIN]
+                rows = np.clip(drop + TOP, 0, HEIGHT - 4)[:, None] + DY
+                landed = self.cells[everyone[:, None], rows] | masks
+                lines = (landed == SOLID).sum(1) - (rows >= TOP + ROWS).sum(1)
+                value = np.where(ok, lines * 100 + drop, -1 << 30)
+                better = value > best
+                best[better] = value[better]
+                best_rot[better] = rot
+                best_x[better] = x
+        self.rot[:], self.x[:] = saved
+        return best_rot, best_x
+
+def mirror_state(batch, i):
+    state = GameState()
+    state.current = Piece(KINDS[batch.kind[i]], int(batch.x[i]), int(batch.y[i]), int(batch.rot[i]))
+    state.next_queue = [KINDS[k] for k in batch.queue[i, :6]]
+    sync_bag(state, batch, i)
+    return state
+
+def sync_bag(state, batch, i):
+    state.bag = [KINDS[k] for k in batch.queue[i, 6:batch.queue_len[i]][::-1]]
+
+def compare(state, batch, i):
+    expected = (
+        state.board.rows,
+        state.score,
+        state.level,
+        state.total_lines,
+        state.combo,
+        state.b2b,
+        state.game_over,
+        state.hold,
+        state.next_queue,
+    )
+    actual = (
+        batch.boards[i].tolist(),
+        int(batch.score[i]),
+        int(batch.level[i]),
+        int(batch.total_lines[i]),
+        int(batch.combo[i]),
+        bool(batch.b2b[i]),
+        bool(batch.game_over[i]),
+        None if batch.hold[i] < 0 else KINDS[batch.hold[i]],
+        [KINDS[k] for k in batch.next_queue[i]],
+    )
+    if not state.game_over:
+        current = state.current
+        expected += ((current.kind, current.x, current.y, current.rot),)
+        actual += ((KINDS[batch.kind[i]], int(batch.x[i]), int(batch.y[i]), int(batch.rot[i])),)
+    return expected == actual
+
+def check_consistency(n=64, steps=3000, seed=0):
+    batch = BatchGame(n, seed)
+    states = [mirror_state(batch, i) for i in range(n)]
+    rng = np.random.default_rng(seed + 1)
+    weights = np.array([4, 4, 2, 3, 3, 1, 1, 1, 1], float)
+    for step in range(steps):
+        actions = rng.choice(len(ACTIONS), n, p=weights / weights.sum())
+        ms = int(rng.integers(0, 120))
+        for i, state in enumerate(states):
+            sync_bag(state, batch, i)
+            state.step(ACTIONS[actions[i]])
+        batch.step(actions)
+        for i, state in enumerate(states):
+            sync_bag(state, batch, i)
+            state.tick(ms)
+        batch.tick(ms)
+        for i, state in enumerate(states):
+            if not compare(state, batch, i):
+                raise AssertionError(f"game {i} diverged from engine.GameState at step {step}")
+        if batch.game_over.all():
+            break
+
+    batch = BatchGame(n, seed)
+    states = [mirror_state(batch, i) for i in range(n)]
+    for step in range(steps):
+        rot, x = batch.greedy_placements()
+        rot_r, x_r = batch.random_placements()
+        noisy = rng.random(n) < 0.1
+        rot[noisy], x[noisy] = rot_r[noisy], x_r[noisy]
+        for i, state in enumerate(states):
+            if state.game_over:
+                continue
+            sync_bag(state, batch, i)
+            target = Piece(state.current.kind, int(x[i]), state.current.y, int(rot[i]))
+            if not valid(target, state.board):
+                state.game_over = True
+                continue
+            state.current = target
+            state.hard_drop()
+        batch.place(rot, x)
+        for i, state in enumerate(states):
+            if not compare(state, batch, i):
+                raise AssertionError(f"game {i} diverged from engine.GameState at placement {step}")
+        if batch.game_over.all():
+            break
+
+def benchmark(n=4096, seconds=2.0, seed=0):
+    batch = BatchGame(n, seed)
+    placed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        before = int(batch.pieces_placed.sum())
+        batch.place(*batch.random_placements())
+        placed += int(batch.pieces_placed.sum()) - before
+        if batch.game_over.mean() > 0.5:
+            batch = BatchGame(n, int(batch.rng.integers(1 << 31)))
+    elapsed = time.perf_counter() - start
+    return placed / elapsed
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        check_consistency()
+        print("batch simulation matches engine.GameState")
+    print(f"{benchmark():,.0f} placements/s")
@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from engine import (
+    COLS,
+    ROWS,
+    SHAPES,
+    Board,
+    GameState,
+    Piece,
+    clear_lines,
+    get_drop_y,
+    valid,
+)
+
+BASELINE = "bench_baseline.json"
+THRESHOLD = 0.25
+REPEAT = 5
+MIN_TIME = 0.05
+BOARD_SEED = 1234
+STARTUP_SCRIPT = "import Tetris; Tetris.init_display(); Tetris.draw_menu(0)"
+
+def random_board(rng, filled_rows, density, full_rows=0):
+    grid = [[None] * COLS for _ in range(ROWS)]
+    kinds = list(SHAPES)
+    for y in range(ROWS - filled_rows, ROWS):
+        row = grid[y]
+        for x in range(COLS):
+            if rng.random() < density:
+                row[x] = rng.choice(kinds)
+        if all(row):
+            row[rng.randrange(COLS)] = None
+    for y in rng.sample(range(ROWS - filled_rows, ROWS), full_rows):
+        grid[y] = [rng.choice(kinds) for _ in range(COLS)]
+    return Board.from_grid(grid)
+
+def boards():
+    rng = random.Random(BOARD_SEED)
+    return {
+        "sparse": random_board(rng, 4, 0.3),
+        "dense": random_board(rng, 14, 0.8),
+        "tetris": random_board(rng, 12, 0.7, full_rows=4),
+    }
+
+def probes(board, count=64):
+    rng = random.Random(BOARD_SEED)
+    kinds = list(SHAPES)
+    return [
+        Piece(rng.choice(kinds), rng.randrange(-1, COLS - 1), rng.randrange(-2, ROWS - 2), rng.randrange(4))
+        for _ in range(count)
+    ]
+
+def bench_valid(board):
+    pieces = probes(board)
+
+    def run(n):
+        start = time.perf_counter()
+        for i in range(n):
+            valid(pieces[i & 63], board)
+        return time.perf_counter() - start
+    return run
+
+def bench_cells():
+    pieces = probes(None)
+
+    def run(n):
+        start = time.perf_counter()
+        for i in range(n):
+            pieces[i & 63].cells()
+        return time.perf_counter() - start
+    return run
+
+def bench_clear_lines(board):
+    def run(n):
+        copies = [board.copy() for _ in range(n)]
+        start = time.perf_counter()
+        for b in copies:
+            clear_lines(b)
+        return time.perf_counter() - start
+    return run
+
+def bench_drop_y(board):
+    pieces = [p for p in probes(board, 256) if valid(p, board)][:64]
+
+    def run(n):
+        start = time.perf_counter()
+        for i in range(n):
+            get_drop_y(pieces[i % len(pieces)], board)
+        return time.perf_counter() - start
+    return run
+
+def bench_rotate(board):
+    # Pieces resting on the stack, so most rotations go through kicks.
+    state = GameState(BOARD_SEED)
+    state.board = board
+    starts = []
+    for kind in SHAPES:
+        for x in range(-1, COLS - 1):
+            piece = Piece(kind, x, -2, 0)
+            if valid(piece, board):
+                starts.append(Piece(kind, x, get_drop_y(piece, board), 0))
+
+    def run(n):
+        k = len(starts)
+        start = time.perf_counter()
+        for i in range(n):
+            state.current = starts[i % k]
+            state.try_rotate(1 if i & 1 else -1)
+        return time.perf_counter() - start
+    return run
+
+def engine_benchmarks():
+    b = boards()
+    return {
+        "valid": bench_valid(b["dense"]),
+        "piece_cells": bench_cells(),
+        "clear_lines_sparse": bench_clear_lines(b["sparse"]),
+        "clear_lines_dense": bench_clear_lines(b["dense"]),
+        "clear_lines_tetris": bench_clear_lines(b["tetris"]),
+        "get_drop_y": bench_drop_y(b["dense"]),
+        "rotate_kicks": bench_rotate(b["dense"]),
+    }
+
+def render_benchmarks(renderer=None):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import Tetris
+
+    Tetris.init_display(renderer)
+    board = boards()["dense"]
+    queue = list("IOTSZJL")
+    particles = Tetris.ParticlePool(seed=BOARD_SEED)
+
+    def feed_particles():
+        # Keep the pool near the level a tetris leaves behind.
+        if len(particles) < 600:
+            Tetris.apply_clear_effect(particles, [ROWS - 4, ROWS - 3, ROWS - 2, ROWS - 1])
+        particles.update()
+
+    def frames(draw):
+        def run(n):
+            start = time.perf_counter()
+            for _ in range(n):
+                draw()
+            return time.perf_counter() - start
+        return run
+
+    def board_frame():
+        Tetris.draw_static_layer("play")
+        Tetris.draw_board(board)
+
+    def panel_frame():
+        Tetris.draw_panel(123456, 7, 89, "T", queue, False, 3, True)
+
+    def particle_frame():
+        feed_particles()
+        particles.draw()
+
+    def full_frame():
+        board_frame()
+        particle_frame()
+        panel_frame()
+
+    def presented_frame():
+        # The texture backend only queues draws until present(), so this
+        # is the one to compare across renderers.
+        full_frame()
+        Tetris.screen.present()
+
+    return {
+        "render_board": frames(board_frame),
+        "render_panel": frames(panel_frame),
+        "render_particles": frames(particle_frame),
+        "render_frame": frames(full_frame),
+        "render_present": frames(presented_frame),
+    }
+
+def bench_startup():
+    # Cold start of a fresh interpreter up to the first menu frame.
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def run(n):
+        start = time.perf_counter()
+        for _ in range(n):
+            subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT],
+                cwd=here,
+                env=env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        return time.perf_counter() - start
+    return run
+
+def measure(run):
+    n = 1
+    while run(n) < MIN_TIME:
+        n *= 4
+    best = min(run(n) for _ in range(REPEAT))
+    return best / n * 1e9
+
+def run_benchmarks(only=None, render=True, renderer=None):
+    suites = engine_benchmarks()
+    if render:
+        suites.update(render_benchmarks(renderer))
+        suites["startup_menu"] = bench_startup()
+    results = {}
+    for name, run in suites.items():
+        if only and not any(part in name for part in only):
+            continue
+        results[name] = round(measure(run), 1)
+    return results
+
+def compare(results, baseline, threshold=THRESHOLD):
+    regressions = []
+    rows = []
+    for name, ns in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, ns, None, None))
+            continue
+        change = ns / base - 1
+        rows.append((name, ns, base, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time engine and renderer hot paths.")
+    parser.add_argument("only", nargs="*", help="run benchmarks whose name contains one of these")
+    parser.add_argument("--no-render", action="store_true", help="skip the pygame frame benchmarks")
+    parser.add_argument("--renderer", help="render backend to time, surface or texture")
+    parser.add_argument("--baseline", default=BASELINE, help="results to compare against")
+    parser.add_argument("--save", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, render=not args.no_render, renderer=args.renderer)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "renderer": args.renderer or os.environ.get("TETRIS_RENDERER", "surface"),
+        "unit": "ns/op",
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    rows, regressions = compare(results, baseline, args.threshold)
+    for name, ns, base, change in rows:
+        if base is None:
+            print(f"{name:<20} {ns:>12.1f} ns")
+        else:
+            flag = "  REGRESSED" if name in regressions else ""
+            print(f"{name:<20} {ns:>12.1f} ns  baseline {base:>12.1f} ns  {change:+7.1%}{flag}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"saved baseline to {args.baseline}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
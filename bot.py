@@ -0,0 +1,434 @@
+import random
+import sys
+import time
+
+from engine import (
+    COLS,
+    ROWS,
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_DOWN,
+    ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW,
+    ACTION_HARD_DROP,
+    ACTION_HOLD,
+    KICK_TABLE,
+    PIECE_TABLE,
+    STATE_CCW,
+    STATE_CW,
+    STATE_DOWN,
+    STATE_LEFT,
+    STATE_PIECES,
+    STATE_RIGHT,
+    Board,
+    GameState,
+    TranspositionTable,
+    fits,
+    load_state_tables,
+    piece_at,
+    position_key,
+    state_fits,
+    state_id,
+)
+from features import heights_and_holes, placement_features
+
+SHIFTS = (
+    (ACTION_LEFT, STATE_LEFT),
+    (ACTION_RIGHT, STATE_RIGHT),
+)
+TURNS = (
+    (ACTION_ROTATE_CW, STATE_CW, 1),
+    (ACTION_ROTATE_CCW, STATE_CCW, -1),
+)
+
+PLACEMENT_CACHE_SIZE = 4096
+DECISION_TABLE_SIZE = 1 << 10
+
+def build_footprints():
+    # Rotations that cover the same cells (all of O's, I/S/Z's opposite
+    # pairs) share a footprint id, so their placements dedupe to one.
+    ids = {}
+    table = {}
+    for kind, shapes in PIECE_TABLE.items():
+        table[kind] = []
+        for shape in shapes:
+            row = []
+            for masks in shape.masks:
+                cells = tuple((dy - shape.top, mask) for dy, mask in masks)
+                row.append(ids.setdefault(cells, len(ids)))
+            table[kind].append(row)
+    return table
+
+FOOTPRINTS = build_footprints()
+
+def cells_key(kind, x, y, rot):
+    shape = PIECE_TABLE[kind][rot]
+    return (y + shape.top) << 12 | FOOTPRINTS[kind][rot][x - shape.x_lo]
+
+class Placement:
+    __slots__ = ("kind", "x", "y", "rot", "use_hold", "path")
+
+    def __init__(self, kind, x, y, rot, path, use_hold=False):
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.rot = rot
+        self.path = path
+        self.use_hold = use_hold
+
+    def actions(self):
+        actions = [ACTION_HOLD] if self.use_hold else []
+        for action, count in self.path:
+            actions.extend([action] * count)
+        actions.append(ACTION_HARD_DROP)
+        return actions
+
+EMPTY_BOARD = Board()
+FREE_AIR = {}
+
+def turn(s, table, rows):
+    # Where a rotation from s ends up: the first kick candidate that fits.
+    for nxt in table[s]:
+        if nxt < 0:
+            break
+        if state_fits(nxt, rows):
+            return nxt
+    return -1
+
+def expand(s, rows, parents, frontier):
+    # Poses are engine state ids, so a shift is a table lookup and a
+    # rotation walks the precomputed kick candidates.
+    for action, table in SHIFTS:
+        nxt = table[s]
+        if nxt >= 0 and nxt not in parents and state_fits(nxt, rows):
+            parents[nxt] = (s, action, 1)
+            frontier.append(nxt)
+    for action, table, _ in TURNS:
+        nxt = turn(s, table, rows)
+        if nxt >= 0 and nxt not in parents:
+            parents[nxt] = (s, action, 1)
+            frontier.append(nxt)
+
+def free_air(start):
+    # Every pose reachable without dropping, worked out once on an empty
+    # board. It holds on a real board as long as the stack stays below
+    # the deepest row any of those poses touch. Also lists the columns
+    # (one rotation and x; a pose id less its y) those poses fall down,
+    # each with its highest pose and the moves out of it that
+    # drop_columns() tries.
+    cached = FREE_AIR.get(start)
+    if cached is None:
+        parents = {start: None}
+        frontier = [start]
+        rows = EMPTY_BOARD.rows
+        i = 0
+        while i < len(frontier):
+            expand(frontier[i], rows, parents, frontier)
+            i += 1
+        deepest = max(piece.y + PIECE_TABLE[piece.kind][piece.rot].bottom for piece in map(STATE_PIECES.__getitem__, frontier))
+        tops = {}
+        for s in frontier:
+            column = s - STATE_PIECES[s].y
+            if column not in tops or s < tops[column]:
+                tops[column] = s
+        columns = []
+        for column, top in tops.items():
+            piece = STATE_PIECES[top]
+            kind, x, rot = piece.kind, piece.x, piece.rot
+            shape = PIECE_TABLE[kind][rot]
+            xi = x - shape.x_lo
+            exits = []
+            for action, table in SHIFTS:
+                if table[top] >= 0:
+                    exits.append((action, table, False, rot, xi + STATE_PIECES[table[top]].x - x, 0, board_columns(shape, x + STATE_PIECES[table[top]].x - x)))
+            for action, table, step in TURNS:
+                # The first kick in range fits wherever it too is above
+                # its landing row, and then nothing later is tried.
+                new_rot = (rot + step) % 4
+                new_shape = PIECE_TABLE[kind][new_rot]
+                kicks = [(dx, dy) for dx, dy in KICK_TABLE[kind, rot, new_rot] if new_shape.x_lo <= x + dx <= new_shape.x_hi]
+                if kicks:
+                    dx, dy = kicks[0]
+                    covers = 0
+                    for kx, _ in kicks:
+                        covers |= board_columns(new_shape, x + kx)
+                    exits.append((action, table, True, new_rot, x + dx - new_shape.x_lo, dy, covers))
+            columns.append((column, top, piece.y, rot, xi, shape.top, FOOTPRINTS[kind][rot][xi], tuple(exits)))
+        cached = FREE_AIR[start] = (parents, tuple(columns), deepest)
+    return cached
+
+def board_columns(shape, x):
+    covers = 0
+    for _, mask in shape.masks[x - shape.x_lo]:
+        covers |= mask
+    return covers
+
+def landing_rows(kind, heights):
+    # For each rotation and x, the row a piece dropped from above the
+    # stack comes to rest on.
+    surface = [ROWS - 1 - h for h in heights]
+    landing = []
+    for shape in PIECE_TABLE[kind]:
+        n = shape.x_hi - shape.x_lo + 1
+        spans = [[surface[x] - bottom for x in range(shape.x_lo + cx, shape.x_lo + cx + n)] for cx, bottom in shape.columns]
+        landing.append(spans[0] if len(spans) == 1 else list(map(min, *spans)))
+    return landing
+
+def reached(s, parents, dropped):
+    if s in parents:
+        return True
+    y = STATE_PIECES[s].y
+    rows = dropped.get(s - y)
+    return rows is not None and rows[0] <= y <= rows[1]
+
+def drop_columns(kind, board, air, columns, found):
+    # With the stack below free air, every pose from free air straight
+    # down to the landing row is reached by dropping, so each column is
+    # taken whole; dropped maps a column to the rows it covers. A shift
+    # or rotation out of a column only reaches something new, a pocket
+    # under an overhang, from the rows low enough to end up below the
+    # target column's landing row, so only those are tried. What they
+    # reach is returned to be searched a row at a time.
+    rows = board.rows
+    landing = landing_rows(kind, board.heights)
+    parents = dict(air)
+    # Columns with an empty cell under a filled one; nothing can move
+    # into a column without one and not be above its landing row.
+    pockets = 0
+    covered = 0
+    for r in rows:
+        pockets |= covered & ~r
+        covered |= r
+    dropped = {}
+    for column, top, y0, rot, xi, cell_top, footprint, exits in columns:
+        land = landing[rot][xi]
+        dropped[column] = (y0, land)
+        if column + land not in parents:
+            parents[column + land] = (top, ACTION_DOWN, land - y0)
+        if land + cell_top >= 0:
+            found.setdefault((land + cell_top) << 12 | footprint, column + land)
+
+    frontier = []
+    for column, top, y0, rot, xi, cell_top, footprint, exits in columns:
+        land = landing[rot][xi]
+        for action, table, turns, new_rot, new_xi, dy, covers in exits:
+            if not pockets & covers:
+                continue
+            for y in range(max(y0, landing[new_rot][new_xi] - dy + 1), land + 1):
+                s = column + y
+                if turns:
+                    nxt = turn(s, table, rows)
+                    if nxt < 0:
+                        continue
+                else:
+                    nxt = table[s]
+                    if not state_fits(nxt, rows):
+                        continue
+                if not reached(nxt, parents, dropped):
+                    if s not in parents:
+                        parents[s] = (top, ACTION_DOWN, y - y0)
+                    parents[nxt] = (s, action, 1)
+                    frontier.append(nxt)
+    return parents, frontier, dropped
+
+def search(rows, parents, frontier, dropped, found):
+    # Breadth-first over single moves, down included one row at a time.
+    i = 0
+    while i < len(frontier):
+        s = frontier[i]
+        i += 1
+        below = STATE_DOWN[s]
+        if below >= 0 and state_fits(below, rows):
+            if not reached(below, parents, dropped):
+                parents[below] = (s, ACTION_DOWN, 1)
+                frontier.append(below)
+        else:
+            piece = STATE_PIECES[s]
+            if piece.y + PIECE_TABLE[piece.kind][piece.rot].top >= 0:
+                found.setdefault(cells_key(piece.kind, piece.x, piece.y, piece.rot), s)
+        for action, table in SHIFTS:
+            nxt = table[s]
+            if nxt >= 0 and state_fits(nxt, rows) and not reached(nxt, parents, dropped):
+                parents[nxt] = (s, action, 1)
+                frontier.append(nxt)
+        for action, table, _ in TURNS:
+            nxt = turn(s, table, rows)
+            if nxt >= 0 and not reached(nxt, parents, dropped):
+                parents[nxt] = (s, action, 1)
+                frontier.append(nxt)
+
+def enumerate_placements(board, kind, x=3, y=-2, rot=0):
+    load_state_tables()
+    start = state_id(kind, rot, x, y)
+    if start < 0:
+        # Only a piece pushed far above the board by garbage gets here.
+        return []
+    found = {}
+    air, columns, deepest = free_air(start)
+    if deepest < ROWS - max(board.heights):
+        parents, frontier, dropped = drop_columns(kind, board, air, columns, found)
+    else:
+        parents = {start: None}
+        frontier = [start]
+        dropped = {}
+    search(board.rows, parents, frontier, dropped, found)
+
+    placements = []
+    for s in found.values():
+        piece = STATE_PIECES[s]
+        path = []
+        while parents[s] is not None:
+            s, action, count = parents[s]
+            if path and path[-1][0] == action:
+                path[-1] = (action, path[-1][1] + count)
+            else:
+                path.append((action, count))
+        path.reverse()
+        placements.append(Placement(kind, piece.x, piece.y, piece.rot, path))
+    return placements
+
+def default_evaluator(heights, holes, lines):
+    bumpiness = 0
+    for a, b in zip(heights, heights[1:]):
+        bumpiness += abs(a - b)
+    return -0.510066 * sum(heights) + 0.760666 * lines - 0.35663 * holes - 0.184483 * bumpiness
+
+class Bot:
+    def __init__(self, evaluator=default_evaluator, use_hold=True):
+        self.evaluator = evaluator
+        self.use_hold = use_hold
+        self.cache = TranspositionTable(PLACEMENT_CACHE_SIZE)
+        self.table = TranspositionTable(DECISION_TABLE_SIZE)
+        self.last_decision_ms = 0.0
+
+    def placements(self, board, kind, x=3, y=-2, rot=0):
+        # Reachability only depends on which cells are filled, not on
+        # their colors, so this keys on the row masks.
+        key = (tuple(board.rows), kind, x, y, rot)
+        placements = self.cache.get(key)
+        if placements is None:
+            placements = enumerate_placements(board, kind, x, y, rot)
+            self.cache.put(key, placements)
+        return placements
+
+    def position(self, state):
+        # Everything decide() looks at: with hold, the held piece (or the
+        # next one, which a first hold would bring in) and whether hold is
+        # still allowed this turn.
+        if self.use_hold:
+            return position_key(state.board, state.current, (state.hold, state.can_hold), state.next_queue, 1)
+        return position_key(state.board, state.current)
+
+    def candidates(self, state):
+        current = state.current
+        yield from self.placements(state.board, current.kind, current.x, current.y, current.rot)
+        if not (self.use_hold and state.can_hold):
+            return
+        other = state.hold if state.hold is not None else state.next_queue[0]
+        if other == current.kind:
+            return
+        for p in self.placements(state.board, other):
+            held = Placement(p.kind, p.x, p.y, p.rot, p.path, use_hold=True)
+            yield held
+
+    def decide(self, state):
+        start = time.perf_counter()
+        key = self.position(state)
+        best = self.table.get(key)
+        if best is not None:
+            self.last_decision_ms = (time.perf_counter() - start) * 1000
+            return best
+        best_value = None
+        rows = state.board.rows
+        heights = state.board.heights
+        _, holes = heights_and_holes(rows)
+        for placement in self.candidates(state):
+            value = self.evaluator(*placement_features(rows, heights, holes, placement))
+            if best is None or value > best_value:
+                best, best_value = placement, value
+        if best is not None:
+            self.table.put(key, best)
+        self.last_decision_ms = (time.perf_counter() - start) * 1000
+        return best
+
+    def plan(self, state):
+        best = self.decide(state)
+        if best is None:
+            return [ACTION_HARD_DROP]
+        return best.actions()
+
+def reference_placements(board, kind, x=3, y=-2, rot=0):
+    # The same moves as enumerate_placements, one row or column at a
+    # time straight off fits() and KICK_TABLE, without the state tables.
+    start = (x, y, rot)
+    seen = {start}
+    frontier = [start]
+    found = set()
+    for x, y, rot in frontier:
+        moves = [(x - 1, y, rot), (x + 1, y, rot), (x, y + 1, rot)]
+        for step in (1, -1):
+            new_rot = (rot + step) % 4
+            for dx, dy in KICK_TABLE[kind, rot, new_rot]:
+                if fits(kind, new_rot, x + dx, y + dy, board):
+                    moves.append((x + dx, y + dy, new_rot))
+                    break
+        if not fits(kind, rot, x, y + 1, board) and y + PIECE_TABLE[kind][rot].top >= 0:
+            found.add(cells_key(kind, x, y, rot))
+        for move in moves:
+            if move not in seen and fits(kind, move[2], move[0], move[1], board):
+                seen.add(move)
+                frontier.append(move)
+    return found
+
+def random_stack(rng):
+    rows = [0] * ROWS
+    height = rng.randrange(ROWS - 4)
+    density = rng.uniform(0.3, 0.9)
+    for y in range(ROWS - height, ROWS):
+        row = 0
+        for x in range(COLS):
+            if rng.random() < density:
+                row |= 1 << x
+        rows[y] = row & ~(1 << rng.randrange(COLS))
+    return Board(rows)
+
+def check_placements(boards=500, seed=0):
+    rng = random.Random(seed)
+    state = GameState(seed)
+    for _ in range(boards):
+        board = random_stack(rng)
+        for kind in PIECE_TABLE:
+            placements = enumerate_placements(board, kind)
+            got = {cells_key(p.kind, p.x, p.y, p.rot) for p in placements}
+            if got != reference_placements(board, kind):
+                raise AssertionError(f"placements for {kind} differ on rows {board.rows}")
+            for p in placements:
+                state.board = board.copy()
+                state.current = piece_at(kind, 3, -2, 0)
+                state.game_over = False
+                for action in p.actions()[:-1]:
+                    state.step(action)
+                piece = state.current
+                if (piece.x, piece.y, piece.rot) != (p.x, p.y, p.rot) or state.ghost_y() != piece.y:
+                    raise AssertionError(f"path for {kind} at {p.x},{p.y},{p.rot} ends elsewhere on rows {board.rows}")
+
+def play(state=None, bot=None, max_pieces=None):
+    state = state or GameState()
+    bot = bot or Bot()
+    while not state.game_over:
+        if max_pieces is not None and state.pieces_placed >= max_pieces:
+            break
+        for action in bot.plan(state):
+            state.step(action)
+    return state
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        check_placements()
+        print("placements match a brute-force search")
+    bot = Bot()
+    start = time.perf_counter()
+    state = play(bot=bot, max_pieces=2000)
+    elapsed = time.perf_counter() - start
+    print(f"pieces={state.pieces_placed} lines={state.total_lines} score={state.score} "
+          f"level={state.level} {elapsed / max(1, state.pieces_placed) * 1000:.3f} ms/piece")
@@ -0,0 +1,397 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from bot import Bot, cells_key, enumerate_placements
+from engine import (
+    COLS,
+    ROWS,
+    GARBAGE,
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_DOWN,
+    ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW,
+    ACTION_HARD_DROP,
+    ACTION_HOLD,
+    PIECE_TABLE,
+    STATE_CCW,
+    STATE_CW,
+    STATE_LEFT,
+    STATE_PIECES,
+    STATE_RIGHT,
+    Board,
+    GameState,
+    Piece,
+    drop_row,
+    row_key,
+    state_fits,
+    state_id,
+)
+
+# A line protocol for bots running in another process. The server opens
+# with "tetris <version> <cols> <rows> <games>" (bots skip anything
+# before it), then every round is
+#
+#   round <n>
+#   s <game> <kind> <x> <y> <rot> <hold|-> <can_hold> <queue> <board>
+#   ... n state lines
+#
+# and the bot answers each state line, in order, with one line of
+# commands separated by ";":
+#
+#   place <x> <y> <rot> [hold]   lock the piece (or the held one) there
+#   input <letters>              l r d c z h D: left, right, down, cw,
+#                                ccw, hold, hard drop
+#   tick <ms>                    let gravity run
+#
+# A board is the row masks from the highest non-empty row down to the
+# floor, three hex digits each, or "-" when empty. The server may also
+# send "error <game> <message>" for a command it rejected,
+# "over <game> <score> <lines> <pieces>" when a game ends, and "end".
+VERSION = 1
+ROW_DIGITS = 3
+MAX_COMMANDS = 64
+SPAWN = (3, -2, 0)
+
+INPUTS = {
+    "l": ACTION_LEFT,
+    "r": ACTION_RIGHT,
+    "d": ACTION_DOWN,
+    "c": ACTION_ROTATE_CW,
+    "z": ACTION_ROTATE_CCW,
+    "h": ACTION_HOLD,
+    "D": ACTION_HARD_DROP,
+}
+INPUT_LETTERS = {action: letter for letter, action in INPUTS.items()}
+
+def encode_board(rows):
+    for top, row in enumerate(rows):
+        if row:
+            return "".join(f"{r:03x}" for r in rows[top:])
+    return "-"
+
+def decode_board(text):
+    if text == "-":
+        return [0] * ROWS
+    rows = [int(text[i:i + ROW_DIGITS], 16) for i in range(0, len(text), ROW_DIGITS)]
+    return [0] * (ROWS - len(rows)) + rows
+
+def encode_state(game_id, state):
+    current = state.current
+    return (
+        f"s {game_id} {current.kind} {current.x} {current.y} {current.rot} "
+        f"{state.hold or '-'} {int(state.can_hold)} {''.join(state.next_queue)} {encode_board(state.board.rows)}"
+    )
+
+# Bots only get the filled cells, so a view's board is all garbage. Its
+# rows and their Zobrist keys repeat a lot and are built once each.
+GARBAGE_ROWS = {}
+GARBAGE_KEYS = {}
+
+def garbage_row(r):
+    row = GARBAGE_ROWS.get(r)
+    if row is None:
+        row = GARBAGE_ROWS[r] = [GARBAGE if r >> x & 1 else None for x in range(COLS)]
+    return row
+
+def garbage_key(y, r):
+    key = GARBAGE_KEYS.get((y, r))
+    if key is None:
+        key = GARBAGE_KEYS[y, r] = row_key(y, garbage_row(r))
+    return key
+
+def garbage_board(rows):
+    key = 0
+    for y, r in enumerate(rows):
+        if r:
+            key ^= garbage_key(y, r)
+    return Board(rows, [garbage_row(r)[:] for r in rows], key)
+
+class BotView:
+    # What a bot knows about a game from one state line, shaped like the
+    # GameState fields Bot reads.
+    __slots__ = ("game_id", "board", "current", "hold", "can_hold", "next_queue")
+
+    def __init__(self, game_id, board, current, hold, can_hold, next_queue):
+        self.game_id = game_id
+        self.board = board
+        self.current = current
+        self.hold = hold
+        self.can_hold = can_hold
+        self.next_queue = next_queue
+
+def decode_state(line):
+    _, game_id, kind, x, y, rot, hold, can_hold, queue, board = line.split()
+    return BotView(
+        int(game_id),
+        garbage_board(decode_board(board)),
+        Piece(kind, int(x), int(y), int(rot)),
+        None if hold == "-" else hold,
+        can_hold == "1",
+        list(queue),
+    )
+
+def direct_path(board, kind, start, x, rot, target):
+    # Rotate where the piece is, slide over and hard drop: how most
+    # placements are reached, and far cheaper to check than a search.
+    s = state_id(kind, start[2], start[0], start[1])
+    if s < 0:
+        return None
+    rows = board.rows
+    turns = (rot - start[2]) % 4
+    action, table = (ACTION_ROTATE_CCW, STATE_CCW) if turns == 3 else (ACTION_ROTATE_CW, STATE_CW)
+    actions = []
+    for _ in range(1 if turns == 3 else turns):
+        for nxt in table[s]:
+            if nxt < 0:
+                return None
+            if state_fits(nxt, rows):
+                s = nxt
+                break
+        else:
+            return None
+        actions.append(action)
+    action, table = (ACTION_RIGHT, STATE_RIGHT) if x > STATE_PIECES[s].x else (ACTION_LEFT, STATE_LEFT)
+    while STATE_PIECES[s].x != x:
+        s = table[s]
+        if s < 0 or not state_fits(s, rows):
+            return None
+        actions.append(action)
+    piece = STATE_PIECES[s]
+    if cells_key(kind, piece.x, drop_row(kind, piece.rot, piece.x, piece.y, board), piece.rot) != target:
+        return None
+    actions.append(ACTION_HARD_DROP)
+    return actions
+
+def place(state, x, y, rot, use_hold=False):
+    # Drives the piece there through the same inputs a player would use,
+    # so a placement the piece can't reach is refused.
+    if use_hold:
+        if not state.can_hold:
+            return "hold already used"
+        kind = state.hold if state.hold is not None else state.next_queue[0]
+        start = SPAWN
+    else:
+        current = state.current
+        kind = current.kind
+        start = (current.x, current.y, current.rot)
+    shape = PIECE_TABLE[kind][rot]
+    if not shape.x_lo <= x <= shape.x_hi:
+        return f"{kind} can't be at {x} {y} {rot}"
+    target = cells_key(kind, x, y, rot)
+    actions = direct_path(state.board, kind, start, x, rot, target)
+    if actions is None:
+        for placement in enumerate_placements(state.board, kind, *start):
+            if cells_key(kind, placement.x, placement.y, placement.rot) == target:
+                actions = placement.actions()
+                break
+        else:
+            return f"{kind} can't reach {x} {y} {rot}"
+    if use_hold:
+        state.step(ACTION_HOLD)
+    for action in actions:
+        state.step(action)
+    return None
+
+def run_command(state, command):
+    parts = command.split()
+    if not parts:
+        return None
+    name, args = parts[0], parts[1:]
+    try:
+        if name == "place" and len(args) in (3, 4):
+            if len(args) == 4 and args[3] != "hold":
+                return f"bad place flag {args[3]!r}"
+            return place(state, int(args[0]), int(args[1]), int(args[2]) % 4, len(args) == 4)
+        if name == "input" and len(args) == 1:
+            actions = [INPUTS[letter] for letter in args[0]]
+            for action in actions:
+                state.step(action)
+            return None
+        if name == "tick" and len(args) == 1:
+            state.tick(max(0, int(args[0])))
+            return None
+    except (KeyError, ValueError, IndexError):
+        pass
+    return f"bad command {command.strip()!r}"
+
+class BotServer:
+    def __init__(self, inp, out, seeds, max_pieces=1000):
+        self.inp = inp
+        self.out = out
+        self.games = {i: GameState(seed) for i, seed in enumerate(seeds)}
+        self.max_pieces = max_pieces
+        self.results = {}
+        self.rounds = 0
+        self.replies = 0
+        self.commands = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+
+    def finished(self, game_id):
+        state = self.games[game_id]
+        return state.game_over or state.pieces_placed >= self.max_pieces
+
+    def run(self):
+        out = self.out
+        out.write(f"tetris {VERSION} {COLS} {ROWS} {len(self.games)}\n")
+        active = list(self.games)
+        start = time.perf_counter()
+        while active:
+            # One write and one flush per round, however many games.
+            lines = [f"round {len(active)}"]
+            lines.extend(encode_state(i, self.games[i]) for i in active)
+            out.write("\n".join(lines) + "\n")
+            out.flush()
+            self.rounds += 1
+
+            still = []
+            for i in active:
+                waited = time.perf_counter()
+                reply = self.inp.readline()
+                self.wait_seconds += time.perf_counter() - waited
+                if not reply:
+                    active = []
+                    still = []
+                    break
+                self.replies += 1
+                state = self.games[i]
+                for command in reply.split(";")[:MAX_COMMANDS]:
+                    self.commands += 1
+                    error = run_command(state, command)
+                    if error is not None:
+                        self.errors += 1
+                        out.write(f"error {i} {error}\n")
+                    if self.finished(i):
+                        break
+                if self.finished(i):
+                    self.results[i] = state
+                    out.write(f"over {i} {state.score} {state.total_lines} {state.pieces_placed}\n")
+                else:
+                    still.append(i)
+            active = still
+        out.write("end\n")
+        out.flush()
+        self.seconds = time.perf_counter() - start
+        return self.results
+
+    def report(self):
+        pieces = sum(state.pieces_placed for state in self.games.values())
+        return {
+            "games": len(self.games),
+            "finished": len(self.results),
+            "pieces": pieces,
+            "rounds": self.rounds,
+            "commands": self.commands,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "ms_per_piece": round(self.seconds * 1000 / max(1, pieces), 4),
+            "bot_wait_ms_per_piece": round(self.wait_seconds * 1000 / max(1, pieces), 4),
+        }
+
+def reply_for(bot, view):
+    best = bot.decide(view)
+    if best is None:
+        return "input D"
+    return f"place {best.x} {best.y} {best.rot}" + (" hold" if best.use_hold else "")
+
+def client(inp=None, out=None, bot=None):
+    # The bundled bot, playing over the protocol.
+    inp = inp or sys.stdin
+    out = out or sys.stdout
+    bot = bot or Bot()
+    think = 0.0
+    for line in inp:
+        if line.startswith("tetris "):
+            break
+    for line in inp:
+        if line.startswith("round "):
+            replies = []
+            for _ in range(int(line.split()[1])):
+                view = decode_state(inp.readline())
+                started = time.perf_counter()
+                replies.append(reply_for(bot, view))
+                think += time.perf_counter() - started
+            out.write("\n".join(replies) + "\n")
+            out.flush()
+        elif line.startswith("end"):
+            break
+    return think
+
+def self_test(games, seed, max_pieces):
+    # Plays the bundled bot through a child process, then the same games
+    # in-process, so the difference is what the protocol costs.
+    child = subprocess.Popen(
+        [sys.executable, __file__, "client"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        bufsize=1 << 16,
+    )
+    server = BotServer(child.stdout, child.stdin, range(seed, seed + games), max_pieces)
+    server.run()
+    child.stdin.close()
+    child.wait()
+    report = server.report()
+
+    bot = Bot()
+    pieces = 0
+    start = time.perf_counter()
+    for s in range(seed, seed + games):
+        state = GameState(s)
+        while not state.game_over and state.pieces_placed < max_pieces:
+            for action in bot.plan(state):
+                state.step(action)
+        pieces += state.pieces_placed
+    local = (time.perf_counter() - start) * 1000 / max(1, pieces)
+    report["in_process_ms_per_piece"] = round(local, 4)
+    report["overhead_ms_per_piece"] = round(report["ms_per_piece"] - local, 4)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play headless games against a bot over stdin/stdout.")
+    sub = parser.add_subparsers(dest="command")
+    serve_cmd = sub.add_parser("serve", help="run games on stdin/stdout (the default)")
+    sub.add_parser("client", help="play the bundled bot over stdin/stdout")
+    test_cmd = sub.add_parser("selftest", help="time the bundled bot through a pipe")
+    for cmd in (serve_cmd, test_cmd):
+        cmd.add_argument("--games", type=int, default=1)
+        cmd.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+        cmd.add_argument("--max-pieces", type=int, default=1000)
+    serve_cmd.add_argument("--bot", help="run this command and talk to it instead of stdin/stdout")
+    serve_cmd.add_argument("--json", help="write the summary to this file")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0].startswith("-"):
+        argv.insert(0, "serve")
+    args = parser.parse_args(argv)
+
+    if args.command == "client":
+        client()
+        return
+    if args.command == "selftest":
+        print(json.dumps(self_test(args.games, args.seed, args.max_pieces), indent=2))
+        return
+
+    seeds = range(args.seed, args.seed + args.games)
+    child = None
+    if args.bot:
+        child = subprocess.Popen(args.bot, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        server = BotServer(child.stdout, child.stdin, seeds, args.max_pieces)
+    else:
+        server = BotServer(sys.stdin, sys.stdout, seeds, args.max_pieces)
+    server.run()
+    if child is not None:
+        child.stdin.close()
+        child.wait()
+    report = server.report()
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+    print(text, file=sys.stderr)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
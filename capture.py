@@ -0,0 +1,141 @@
+import mmap
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+CAPTURE_SLOTS = 8
+RING_FRAMES = 600
+RING_MAGIC = b"NTFR"
+# magic, width, height, capacity, frames written so far
+RING_HEADER = struct.Struct("<4sIIIQ")
+
+class StreamSink:
+    # Raw RGB24 frames back to back, e.g. for
+    # ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -r 60 -i - out.mp4
+    def __init__(self, out, process=None):
+        self.out = out
+        self.process = process
+
+    def write(self, rgb):
+        self.out.write(memoryview(rgb).cast("B"))
+
+    def close(self):
+        self.out.flush()
+        if self.process is not None:
+            self.out.close()
+            self.process.wait()
+        elif self.out is not sys.stdout.buffer:
+            self.out.close()
+
+class RingSink:
+    # A fixed-size memory-mapped file holding the last `capacity` frames,
+    # so a bug report can grab the seconds before it was filed.
+    def __init__(self, path, size, capacity=RING_FRAMES):
+        width, height = size
+        self.frame_bytes = width * height * 3
+        self.capacity = capacity
+        self.count = 0
+        length = RING_HEADER.size + capacity * self.frame_bytes
+        with open(path, "wb") as f:
+            f.truncate(length)
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), length)
+        self.size = size
+        self.write_header()
+
+    def write_header(self):
+        width, height = self.size
+        RING_HEADER.pack_into(self.map, 0, RING_MAGIC, width, height, self.capacity, self.count)
+
+    def write(self, rgb):
+        start = RING_HEADER.size + (self.count % self.capacity) * self.frame_bytes
+        self.map[start:start + self.frame_bytes] = memoryview(rgb).cast("B")
+        self.count += 1
+        self.write_header()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+def read_ring(path):
+    # Frames from a ring file, oldest first, as (height, width, 3) arrays.
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, width, height, capacity, count = RING_HEADER.unpack_from(data)
+    if magic != RING_MAGIC:
+        raise ValueError("not a frame ring file")
+    frames = np.frombuffer(data, np.uint8, offset=RING_HEADER.size).reshape(capacity, height, width, 3)
+    n = min(count, capacity)
+    first = count - n
+    return [frames[i % capacity] for i in range(first, count)]
+
+class FrameCapture:
+    # grab() copies the finished frame into a free slot, a single copy of
+    # the raw pixels while the surface is locked. A writer thread turns
+    # it into RGB and hands it to the sink. When every slot is still
+    # waiting on the writer the frame is dropped, unless wait is set, as
+    # it is for offline export.
+    def __init__(self, sink, surface, slots=CAPTURE_SLOTS):
+        width, height = surface.get_size()
+        if surface.get_bytesize() != 4:
+            raise ValueError("frame capture needs a 32-bit surface")
+        self.sink = sink
+        self.slots = np.empty((slots, height, width), np.uint32)
+        # Byte offset of each channel inside a little-endian pixel.
+        self.channels = [shift // 8 for shift in surface.get_shifts()[:3]]
+        self.free = queue.SimpleQueue()
+        self.ready = queue.SimpleQueue()
+        for i in range(slots):
+            self.free.put(i)
+        self.frames = 0
+        self.dropped = 0
+        self.writer = threading.Thread(target=self.run, name="frame-capture", daemon=True)
+        self.writer.start()
+
+    def grab(self, surface, wait=False):
+        try:
+            i = self.free.get(wait)
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        view = surface.get_view("2")
+        np.copyto(self.slots[i], np.asarray(view).T)
+        del view
+        self.ready.put(i)
+        self.frames += 1
+        return True
+
+    def run(self):
+        while True:
+            i = self.ready.get()
+            if i is None:
+                return
+            pixels = self.slots[i].view(np.uint8).reshape(*self.slots.shape[1:], 4)
+            rgb = np.ascontiguousarray(pixels[:, :, self.channels])
+            self.free.put(i)
+            self.sink.write(rgb)
+
+    def close(self):
+        self.ready.put(None)
+        self.writer.join()
+        self.sink.close()
+
+def open_capture(target, surface):
+    # target is a path, "-" for stdout, "|command" to pipe into a
+    # process, or a path ending in .ring for a memory-mapped ring.
+    if target == "-":
+        sink = StreamSink(sys.stdout.buffer)
+    elif target.startswith("|"):
+        process = subprocess.Popen(target[1:], shell=True, stdin=subprocess.PIPE)
+        sink = StreamSink(process.stdin, process)
+    elif target.endswith(".ring"):
+        sink = RingSink(target, surface.get_size(), int(os.environ.get("TETRIS_CAPTURE_FRAMES", RING_FRAMES)))
+    else:
+        sink = StreamSink(open(target, "wb"))
+    return FrameCapture(sink, surface)
@@ -0,0 +1,122 @@
+import os
+import time
+from collections import deque
+
+from engine import ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT
+from profiler import percentile
+
+# A held left/right shifts once straight away, again after DAS_MS and
+# then every ARR_MS (0 slides to the wall at once). Soft drop moves the
+# piece down SOFT_DROP_FACTOR times faster than gravity; 0 drops it
+# straight to the floor without locking.
+DAS_MS = int(os.environ.get("TETRIS_DAS", "133"))
+ARR_MS = int(os.environ.get("TETRIS_ARR", "33"))
+SOFT_DROP_FACTOR = int(os.environ.get("TETRIS_SDF", "10"))
+LATENCY_SAMPLES = 240
+
+SHIFTS = (ACTION_LEFT, ACTION_RIGHT)
+
+class Controls:
+    # Turns key presses and releases into engine actions. update() runs
+    # once per logic tick, so auto-repeat and soft drop land at the right
+    # point in game time however many ticks a frame covers. apply(action)
+    # steps the game and returns whether the action did anything.
+    def __init__(self, apply, das=DAS_MS, arr=ARR_MS, soft_drop_factor=SOFT_DROP_FACTOR):
+        self.apply = apply
+        self.das = das
+        self.arr = arr
+        self.soft_drop_factor = soft_drop_factor
+        # Both directions can be down at once; the latest press wins.
+        self.held = []
+        self.charge = 0
+        self.shifts = 0
+        self.soft_drop = False
+        self.drop_timer = 0
+
+    def press(self, action):
+        if action in SHIFTS:
+            if action in self.held:
+                self.held.remove(action)
+            self.held.append(action)
+            self.charge = 0
+            self.shifts = 0
+            self.apply(action)
+        else:
+            self.soft_drop = True
+            self.drop_timer = 0
+
+    def release(self, action):
+        if action in SHIFTS:
+            if action in self.held:
+                self.held.remove(action)
+                self.charge = 0
+                self.shifts = 0
+        else:
+            self.soft_drop = False
+
+    def update(self, ms, game):
+        if self.held:
+            direction = self.held[-1]
+            self.charge += ms
+            if self.charge >= self.das:
+                if self.arr <= 0:
+                    while self.apply(direction):
+                        pass
+                else:
+                    due = (self.charge - self.das) // self.arr + 1
+                    while self.shifts < due:
+                        self.shifts += 1
+                        self.apply(direction)
+        if self.soft_drop:
+            if self.soft_drop_factor <= 0:
+                while not game.game_over and game.ghost_y() > game.current.y:
+                    self.apply(ACTION_DOWN)
+                return
+            interval = max(1, game.gravity_ms() // self.soft_drop_factor)
+            self.drop_timer += ms
+            while self.drop_timer >= interval and not game.game_over:
+                self.drop_timer -= interval
+                self.apply(ACTION_DOWN)
+
+class InputLatency:
+    # SDL events carry no timestamp in pygame, so a key is stamped when it
+    # is read off the queue. It can have arrived any time after the
+    # previous read, so each sample is a range: read to present is the
+    # least it took, previous read to present the most.
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.least = deque(maxlen=size)
+        self.most = deque(maxlen=size)
+        self.last_poll = self.poll = time.perf_counter()
+        self.pending = []
+
+    def polled(self):
+        self.last_poll, self.poll = self.poll, time.perf_counter()
+
+    def key(self):
+        self.pending.append((self.poll, self.last_poll))
+
+    def presented(self):
+        if not self.pending:
+            return
+        now = time.perf_counter()
+        for poll, last_poll in self.pending:
+            self.least.append((now - poll) * 1000)
+            self.most.append((now - last_poll) * 1000)
+        self.pending.clear()
+
+    def stats(self):
+        least = sorted(self.least)
+        most = sorted(self.most)
+        return (
+            percentile(least, 0.5),
+            percentile(most, 0.5),
+            percentile(least, 0.99),
+            percentile(most, 0.99),
+        )
+
+    def summary(self):
+        p50_lo, p50_hi, p99_lo, p99_hi = self.stats()
+        return (
+            f"input to display over {len(self.least)} keys: "
+            f"p50 {p50_lo:.1f}-{p50_hi:.1f} ms, p99 {p99_lo:.1f}-{p99_hi:.1f} ms"
+        )
@@ -0,0 +1,822 @@
+import itertools
+import random
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+COLS = 10
+ROWS = 20
+
+SHAPES = {
+    "I": [
+        [(0, 1), (1, 1), (2, 1), (3, 1)],
+        [(2, 0), (2, 1), (2, 2), (2, 3)],
+        [(0, 2), (1, 2), (2, 2), (3, 2)],
+        [(1, 0), (1, 1), (1, 2), (1, 3)],
+    ],
+    "O": [
+        [(1, 0), (2, 0), (1, 1), (2, 1)],
+        [(1, 0), (2, 0), (1, 1), (2, 1)],
+        [(1, 0), (2, 0), (1, 1), (2, 1)],
+        [(1, 0), (2, 0), (1, 1), (2, 1)],
+    ],
+    "T": [
+        [(1, 0), (0, 1), (1, 1), (2, 1)],
+        [(1, 0), (1, 1), (2, 1), (1, 2)],
+        [(0, 1), (1, 1), (2, 1), (1, 2)],
+        [(1, 0), (0, 1), (1, 1), (1, 2)],
+    ],
+    "S": [
+        [(1, 0), (2, 0), (0, 1), (1, 1)],
+        [(1, 0), (1, 1), (2, 1), (2, 2)],
+        [(1, 1), (2, 1), (0, 2), (1, 2)],
+        [(0, 0), (0, 1), (1, 1), (1, 2)],
+    ],
+    "Z": [
+        [(0, 0), (1, 0), (1, 1), (2, 1)],
+        [(2, 0), (1, 1), (2, 1), (1, 2)],
+        [(0, 1), (1, 1), (1, 2), (2, 2)],
+        [(1, 0), (0, 1), (1, 1), (0, 2)],
+    ],
+    "J": [
+        [(0, 0), (0, 1), (1, 1), (2, 1)],
+        [(1, 0), (2, 0), (1, 1), (1, 2)],
+        [(0, 1), (1, 1), (2, 1), (2, 2)],
+        [(1, 0), (1, 1), (0, 2), (1, 2)],
+    ],
+    "L": [
+        [(2, 0), (0, 1), (1, 1), (2, 1)],
+        [(1, 0), (1, 1), (1, 2), (2, 2)],
+        [(0, 1), (1, 1), (2, 1), (0, 2)],
+        [(0, 0), (1, 0), (1, 1), (1, 2)],
+    ],
+}
+
+@dataclass(slots=True, frozen=True)
+class Piece:
+    kind: str
+    x: int
+    y: int
+    rot: int = 0
+    state: int = field(default=-1, compare=False, repr=False)
+
+    def cells(self):
+        return [(self.x + cx, self.y + cy) for cx, cy in PIECE_TABLE[self.kind][self.rot].offsets]
+
+FULL_ROW = (1 << COLS) - 1
+
+# Zobrist keys: one random 64-bit value per (row, column, kind). A board's
+# key is the XOR over its filled cells, so placing a piece only touches
+# the cells that change. A clear moves whole rows, so it just drops the
+# key; it is worked out again the next time something asks for it.
+ZOBRIST_SEED = 0x7E7815
+TABLE_SIZE = 1 << 16
+GARBAGE = "G"
+
+def build_zobrist():
+    rng = random.Random(ZOBRIST_SEED)
+    kinds = list(SHAPES) + [GARBAGE]
+    return [[{kind: rng.getrandbits(64) for kind in kinds} for _ in range(COLS)] for _ in range(ROWS)]
+
+ZOBRIST = build_zobrist()
+
+def row_key(y, colors):
+    key = 0
+    cells = ZOBRIST[y]
+    for x, kind in enumerate(colors):
+        if kind is not None:
+            key ^= cells[x][kind]
+    return key
+
+def rows_key(colors):
+    key = 0
+    for y in range(ROWS):
+        key ^= row_key(y, colors[y])
+    return key
+
+def column_heights(rows, columns=range(COLS)):
+    heights = [0] * COLS
+    for x in columns:
+        bit = 1 << x
+        for y in range(ROWS):
+            if rows[y] & bit:
+                heights[x] = ROWS - y
+                break
+    return heights
+
+# Every change to any board takes a fresh version, so a version tells
+# boards apart as well as one board's states; caches keyed on it stay
+# right when a board is swapped for another or a copy.
+BOARD_VERSIONS = itertools.count(1)
+
+class Board:
+    __slots__ = ("rows", "colors", "heights", "version", "known_key")
+
+    def __init__(self, rows=None, colors=None, key=None):
+        self.rows = rows if rows is not None else [0] * ROWS
+        self.colors = colors if colors is not None else [[None] * COLS for _ in range(ROWS)]
+        self.heights = column_heights(self.rows)
+        self.version = next(BOARD_VERSIONS)
+        self.known_key = key
+
+    @property
+    def key(self):
+        if self.known_key is None:
+            self.known_key = rows_key(self.colors)
+        return self.known_key
+
+    def __getitem__(self, y):
+        return self.colors[y]
+
+    def __iter__(self):
+        return iter(self.colors)
+
+    def __len__(self):
+        return ROWS
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.rows = self.rows[:]
+        board.colors = [row[:] for row in self.colors]
+        board.heights = self.heights[:]
+        board.version = next(BOARD_VERSIONS)
+        board.known_key = self.known_key
+        return board
+
+    def snapshot(self):
+        return BoardSnapshot(tuple(self.rows), tuple(map(tuple, self.colors)), self.known_key)
+
+    def top(self, x):
+        return ROWS - self.heights[x]
+
+    def filled(self, x, y):
+        return (self.rows[y] >> x) & 1 == 1
+
+    def to_grid(self):
+        return [row[:] for row in self.colors]
+
+    @classmethod
+    def from_grid(cls, grid):
+        rows = []
+        for row in grid:
+            bits = 0
+            for x, cell in enumerate(row):
+                if cell is not None:
+                    bits |= 1 << x
+            rows.append(bits)
+        return cls(rows, [list(row) for row in grid])
+
+class BoardSnapshot:
+    # An immutable board. place() returns a new snapshot that shares every
+    # row the piece and the clear leave untouched, so keeping one per
+    # search node or undo step costs a few tuples, not a deep copy.
+    __slots__ = ("rows", "colors", "known_key")
+
+    def __init__(self, rows, colors, key=None):
+        self.rows = rows
+        self.colors = colors
+        self.known_key = key
+
+    @property
+    def key(self):
+        if self.known_key is None:
+            self.known_key = rows_key(self.colors)
+        return self.known_key
+
+    def __hash__(self):
+        return self.key
+
+    def __eq__(self, other):
+        if not isinstance(other, BoardSnapshot):
+            return NotImplemented
+        return self.key == other.key and self.rows == other.rows and self.colors == other.colors
+
+    def __getitem__(self, y):
+        return self.colors[y]
+
+    def to_board(self):
+        return Board(list(self.rows), [list(row) for row in self.colors], self.known_key)
+
+    def place(self, piece):
+        shape = PIECE_TABLE[piece.kind][piece.rot]
+        rows = list(self.rows)
+        colors = list(self.colors)
+        key = self.known_key
+        for dy, mask in shape.masks[piece.x - shape.x_lo]:
+            y = piece.y + dy
+            if y >= 0:
+                rows[y] |= mask
+                row = list(colors[y])
+                for x in range(COLS):
+                    if mask >> x & 1:
+                        row[x] = piece.kind
+                        if key is not None:
+                            key ^= ZOBRIST[y][x][piece.kind]
+                colors[y] = tuple(row)
+        full_rows = [y for y, bits in enumerate(rows) if bits == FULL_ROW]
+        if full_rows:
+            key = None
+            for y in reversed(full_rows):
+                del rows[y]
+                del colors[y]
+            cleared = len(full_rows)
+            rows[:0] = [0] * cleared
+            colors[:0] = [(None,) * COLS] * cleared
+        return BoardSnapshot(tuple(rows), tuple(colors), key), len(full_rows)
+
+class TranspositionTable:
+    # A bounded map from positions to results, dropping the least recently
+    # used entry once full.
+    def __init__(self, capacity=TABLE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entries = self.entries
+        value = entries.get(key, entries)
+        if value is entries:
+            self.misses += 1
+            return default
+        entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+def position_key(board, piece, hold=None, queue=(), depth=0):
+    # Only which cells are filled matters to a search, not their colors.
+    return (tuple(board.rows), (piece.kind, piece.x, piece.y, piece.rot), hold, tuple(queue[:depth]))
+
+def empty_board():
+    return Board()
+
+def in_bounds(x, y):
+    return 0 <= x < COLS and y < ROWS
+
+def fits(kind, rot, x, y, board):
+    shape = PIECE_TABLE[kind][rot]
+    if x < shape.x_lo or x > shape.x_hi or y + shape.bottom >= ROWS:
+        return False
+    rows = board.rows
+    for dy, mask in shape.masks[x - shape.x_lo]:
+        ry = y + dy
+        if ry >= 0 and rows[ry] & mask:
+            return False
+    return True
+
+def valid(piece, board):
+    return fits(piece.kind, piece.rot, piece.x, piece.y, board)
+
+def above_top(piece):
+    return piece.y + PIECE_TABLE[piece.kind][piece.rot].top < 0
+
+def lock_piece(piece, board):
+    shape = PIECE_TABLE[piece.kind][piece.rot]
+    rows = board.rows
+    colors = board.colors
+    heights = board.heights
+    for dy, mask in shape.masks[piece.x - shape.x_lo]:
+        y = piece.y + dy
+        if y >= 0:
+            rows[y] |= mask
+    key = board.known_key
+    for x, y in piece.cells():
+        if y >= 0:
+            colors[y][x] = piece.kind
+            if key is not None:
+                key ^= ZOBRIST[y][x][piece.kind]
+            if ROWS - y > heights[x]:
+                heights[x] = ROWS - y
+    board.known_key = key
+    board.version = next(BOARD_VERSIONS)
+
+def clear_lines(board):
+    rows = board.rows
+    full_rows = [i for i, bits in enumerate(rows) if bits == FULL_ROW]
+    if not full_rows:
+        return board, 0, []
+    colors = board.colors
+    for i in reversed(full_rows):
+        del rows[i]
+        del colors[i]
+    cleared = len(full_rows)
+    rows[:0] = [0] * cleared
+    colors[:0] = [[None] * COLS for _ in range(cleared)]
+    board.known_key = None
+
+    # A column whose top cell sat in the highest cleared row has to be
+    # rescanned; every other column just drops by the cleared count.
+    heights = board.heights
+    top_cleared = ROWS - full_rows[0]
+    rescan = []
+    for x in range(COLS):
+        if heights[x] == top_cleared:
+            rescan.append(x)
+        else:
+            heights[x] -= cleared
+    if rescan:
+        fresh = column_heights(rows, rescan)
+        for x in rescan:
+            heights[x] = fresh[x]
+    board.version = next(BOARD_VERSIONS)
+    return board, cleared, full_rows
+
+def add_garbage(board, lines, hole):
+    # Pushes the stack up and fills the bottom with garbage rows open at
+    # column `hole`. Returns True if that pushed blocks off the top.
+    rows = board.rows
+    colors = board.colors
+    overflow = any(rows[:lines])
+    del rows[:lines]
+    del colors[:lines]
+    row = [GARBAGE] * COLS
+    row[hole] = None
+    rows.extend([FULL_ROW & ~(1 << hole)] * lines)
+    colors.extend([row[:] for _ in range(lines)])
+    board.heights = column_heights(rows)
+    board.known_key = None
+    board.version = next(BOARD_VERSIONS)
+    return overflow
+
+def new_bag(rng=random):
+    bag = list(SHAPES.keys())
+    rng.shuffle(bag)
+    return bag
+
+def spawn_piece(kind):
+    return piece_at(kind, 3, -2, 0)
+
+def get_drop_y(piece, board):
+    return drop_row(piece.kind, piece.rot, piece.x, piece.y, board)
+
+def drop_row(kind, rot, x, y, board):
+    heights = board.heights
+    drop = ROWS
+    for cx, bottom in PIECE_TABLE[kind][rot].columns:
+        land = ROWS - heights[x + cx] - 1 - bottom
+        if land < drop:
+            drop = land
+    if drop >= y:
+        return drop
+    # The piece is tucked below a column surface; fall back to probing.
+    while fits(kind, rot, x, y + 1, board):
+        y += 1
+    return y
+
+def difficulty_multiplier(level):
+    return 2 ** ((level - 1) // 2)
+
+def fall_speed_ms(level):
+    base = max(65, 720 - (level - 1) * 55)
+    mult = difficulty_multiplier(level)
+    return max(35, int(base / mult))
+
+def scoring_for_lines(cleared, level):
+    if cleared == 1: return 100 * level
+    if cleared == 2: return 300 * level
+    if cleared == 3: return 500 * level
+    if cleared == 4: return 800 * level
+    return 0
+
+def is_tetris(cleared):
+    return cleared == 4
+
+JLSTZ_KICKS = {
+    (0, 1): [(0,0), (-1,0), (-1,1), (0,-2), (-1,-2)],
+    (1, 0): [(0,0), (1,0), (1,-1), (0,2), (1,2)],
+    (1, 2): [(0,0), (1,0), (1,-1), (0,2), (1,2)],
+    (2, 1): [(0,0), (-1,0), (-1,1), (0,-2), (-1,-2)],
+    (2, 3): [(0,0), (1,0), (1,1), (0,-2), (1,-2)],
+    (3, 2): [(0,0), (-1,0), (-1,-1), (0,2), (-1,2)],
+    (3, 0): [(0,0), (-1,0), (-1,-1), (0,2), (-1,2)],
+    (0, 3): [(0,0), (1,0), (1,1), (0,-2), (1,-2)],
+}
+I_KICKS = {
+    (0, 1): [(0,0), (-2,0), (1,0), (-2,-1), (1,2)],
+    (1, 0): [(0,0), (2,0), (-1,0), (2,1), (-1,-2)],
+    (1, 2): [(0,0), (-1,0), (2,0), (-1,2), (2,-1)],
+    (2, 1): [(0,0), (1,0), (-2,0), (1,-2), (-2,1)],
+    (2, 3): [(0,0), (2,0), (-1,0), (2,1), (-1,-2)],
+    (3, 2): [(0,0), (-2,0), (1,0), (-2,-1), (1,2)],
+    (3, 0): [(0,0), (1,0), (-2,0), (1,-2), (-2,1)],
+    (0, 3): [(0,0), (-1,0), (2,0), (-1,2), (2,-1)],
+}
+
+def srs_kicks(kind, old_rot, new_rot):
+    if kind == "O":
+        return [(0, 0)]
+    if kind == "I":
+        return I_KICKS.get((old_rot, new_rot), [(0, 0)])
+    return JLSTZ_KICKS.get((old_rot, new_rot), [(0, 0)])
+
+class PieceShape:
+    __slots__ = ("offsets", "x_lo", "x_hi", "top", "bottom", "columns", "masks")
+
+    def __init__(self, offsets):
+        self.offsets = tuple(offsets)
+        xs = [cx for cx, _ in offsets]
+        ys = [cy for _, cy in offsets]
+        self.x_lo = -min(xs)
+        self.x_hi = COLS - 1 - max(xs)
+        self.top = min(ys)
+        self.bottom = max(ys)
+        bottoms = {}
+        for cx, cy in offsets:
+            bottoms[cx] = max(bottoms.get(cx, cy), cy)
+        self.columns = tuple(sorted(bottoms.items()))
+        self.masks = []
+        for x in range(self.x_lo, self.x_hi + 1):
+            rows = {}
+            for cx, cy in offsets:
+                rows[cy] = rows.get(cy, 0) | (1 << (x + cx))
+            self.masks.append(tuple(sorted(rows.items())))
+
+def build_piece_table():
+    return {kind: [PieceShape(rot) for rot in rots] for kind, rots in SHAPES.items()}
+
+def build_kick_table():
+    table = {}
+    for kind in SHAPES:
+        for old_rot in range(4):
+            for new_rot in ((old_rot + 1) % 4, (old_rot - 1) % 4):
+                offsets = [(0, 0)]
+                for kick in srs_kicks(kind, old_rot, new_rot):
+                    if kick not in offsets:
+                        offsets.append(kick)
+                table[kind, old_rot, new_rot] = tuple(offsets)
+    return table
+
+PIECE_TABLE = build_piece_table()
+KICK_TABLE = build_kick_table()
+
+# Every pose a piece can be in, numbered so that within one kind and
+# rotation the id runs over y fastest, then x. A pose's neighbours for
+# each move and its kick candidates for each rotation are ids too, so
+# moving only tests masks against the board. Poses below the floor or
+# through a wall aren't numbered; neither are ones more than STATE_Y_MIN
+# rows above the board, which the engine handles the slow way. No kick
+# from a pose at y >= -4 gets higher than -5, so only garbage lifts a
+# piece out of the table.
+STATE_Y_MIN = -5
+
+def build_state_index():
+    index = {}
+    base = 0
+    for kind, shapes in PIECE_TABLE.items():
+        index[kind] = []
+        for shape in shapes:
+            span = ROWS - shape.bottom - STATE_Y_MIN
+            index[kind].append((base, shape.x_lo, shape.x_hi, span))
+            base += (shape.x_hi - shape.x_lo + 1) * span
+    return index
+
+STATE_INDEX = build_state_index()
+
+def state_id(kind, rot, x, y):
+    base, x_lo, x_hi, span = STATE_INDEX[kind][rot]
+    yi = y - STATE_Y_MIN
+    if x_lo <= x <= x_hi and 0 <= yi < span:
+        return base + (x - x_lo) * span + yi
+    return -1
+
+def build_state_tables():
+    # Built a column (one kind, rotation and x) at a time, where every
+    # neighbour and kick candidate is a run of consecutive ids.
+    pieces = []
+    masks = []
+    left = []
+    right = []
+    down = []
+    cw = []
+    ccw = []
+    for kind, shapes in PIECE_TABLE.items():
+        for rot, shape in enumerate(shapes):
+            base, x_lo, x_hi, span = STATE_INDEX[kind][rot]
+            ys = range(STATE_Y_MIN, STATE_Y_MIN + span)
+            turns = []
+            for out, step in ((cw, 1), (ccw, -1)):
+                new_rot = (rot + step) % 4
+                turns.append((out, STATE_INDEX[kind][new_rot], KICK_TABLE[kind, rot, new_rot]))
+            for x in range(x_lo, x_hi + 1):
+                s = len(pieces)
+                piece_masks = shape.masks[x - x_lo]
+                pieces.extend([Piece(kind, x, y, rot, s + i) for i, y in enumerate(ys)])
+                masks.extend([tuple([(y + dy, mask) for dy, mask in piece_masks if y + dy >= 0]) for y in ys])
+                left.extend(range(s - span, s) if x > x_lo else [-1] * span)
+                right.extend(range(s + span, s + 2 * span) if x < x_hi else [-1] * span)
+                down.extend(range(s + 1, s + span))
+                down.append(-1)
+                for out, (new_base, new_lo, new_hi, new_span), kicks in turns:
+                    runs = []
+                    for dx, dy in kicks:
+                        if not new_lo <= x + dx <= new_hi:
+                            continue
+                        first = max(0, -dy)
+                        stop = min(span, new_span - dy)
+                        origin = new_base + (x + dx - new_lo) * new_span + dy
+                        runs.append([None] * first + list(range(origin + first, origin + stop)) + [-1] * (span - stop))
+                    if not runs:
+                        out.extend([()] * span)
+                        continue
+                    out.extend([ids if -1 not in ids and None not in ids else kick_candidates(ids) for ids in zip(*runs)])
+    return pieces, masks, left, right, down, cw, ccw
+
+def kick_candidates(ids):
+    # Kicks into the floor never fit and are dropped. A kick above the
+    # table always fits, so the list stops there with -1 and the engine
+    # works out that pose the slow way.
+    out = []
+    for i in ids:
+        if i is None:
+            out.append(-1)
+            break
+        if i >= 0:
+            out.append(i)
+    return tuple(out)
+
+# Filled in by load_state_tables() when the first game starts, which
+# keeps the build off the import path.
+STATE_PIECES = []
+STATE_MASKS = []
+STATE_LEFT = []
+STATE_RIGHT = []
+STATE_DOWN = []
+STATE_CW = []
+STATE_CCW = []
+STATE_MOVES = {(-1, 0): STATE_LEFT, (1, 0): STATE_RIGHT, (0, 1): STATE_DOWN}
+STATE_TURNS = {1: STATE_CW, -1: STATE_CCW}
+
+def load_state_tables():
+    if not STATE_PIECES:
+        tables = (STATE_PIECES, STATE_MASKS, STATE_LEFT, STATE_RIGHT, STATE_DOWN, STATE_CW, STATE_CCW)
+        for table, built in zip(tables, build_state_tables()):
+            table.extend(built)
+
+def piece_at(kind, x, y, rot=0):
+    s = state_id(kind, rot, x, y)
+    return STATE_PIECES[s] if s >= 0 else Piece(kind, x, y, rot)
+
+def piece_state(piece):
+    return piece.state if piece.state >= 0 else state_id(piece.kind, piece.rot, piece.x, piece.y)
+
+def state_fits(s, rows):
+    for y, mask in STATE_MASKS[s]:
+        if rows[y] & mask:
+            return False
+    return True
+
+ACTION_LEFT = "left"
+ACTION_RIGHT = "right"
+ACTION_DOWN = "down"
+ACTION_ROTATE_CW = "rotate_cw"
+ACTION_ROTATE_CCW = "rotate_ccw"
+ACTION_HARD_DROP = "hard_drop"
+ACTION_HOLD = "hold"
+ACTION_SOFT_DROP_ON = "soft_drop_on"
+ACTION_SOFT_DROP_OFF = "soft_drop_off"
+
+ACTIONS = (
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_DOWN,
+    ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW,
+    ACTION_HARD_DROP,
+    ACTION_HOLD,
+    ACTION_SOFT_DROP_ON,
+    ACTION_SOFT_DROP_OFF,
+)
+ACTION_CODES = {action: i for i, action in enumerate(ACTIONS)}
+
+class GameState:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.board = empty_board()
+        load_state_tables()
+
+        self.bag = new_bag(self.rng)
+        self.next_queue = []
+        while len(self.next_queue) < 6:
+            if not self.bag:
+                self.bag = new_bag(self.rng)
+            self.next_queue.append(self.bag.pop())
+
+        self.current = spawn_piece(self.next_queue.pop(0))
+        if not self.bag:
+            self.bag = new_bag(self.rng)
+        self.next_queue.append(self.bag.pop())
+
+        self.hold = None
+        self.can_hold = True
+
+        self.score = 0
+        self.level = 1
+        self.total_lines = 0
+        self.combo = 0
+        self.b2b = False
+
+        self.fall_timer = 0
+        self.soft_drop = False
+        self.game_over = False
+
+        self.pieces_placed = 0
+        self.clear_events = []
+        self.ghost_key = None
+        self.ghost_cache = 0
+
+    def try_rotate(self, dir_):
+        current = self.current
+        s = piece_state(current)
+        if s >= 0:
+            rows = self.board.rows
+            for nxt in STATE_TURNS[dir_][s]:
+                if nxt < 0:
+                    break
+                if state_fits(nxt, rows):
+                    self.current = STATE_PIECES[nxt]
+                    return True
+            else:
+                return False
+        kind, x, y = current.kind, current.x, current.y
+        new_rot = (current.rot + dir_) % 4
+        for dx, dy in KICK_TABLE[kind, current.rot, new_rot]:
+            if fits(kind, new_rot, x + dx, y + dy, self.board):
+                self.current = piece_at(kind, x + dx, y + dy, new_rot)
+                return True
+        return False
+
+    def try_move(self, dx, dy):
+        current = self.current
+        s = piece_state(current)
+        if s >= 0:
+            nxt = STATE_MOVES[dx, dy][s]
+            if nxt >= 0 and state_fits(nxt, self.board.rows):
+                self.current = STATE_PIECES[nxt]
+                return True
+            return False
+        if fits(current.kind, current.rot, current.x + dx, current.y + dy, self.board):
+            self.current = piece_at(current.kind, current.x + dx, current.y + dy, current.rot)
+            return True
+        return False
+
+    def spawn_next(self):
+        self.current = spawn_piece(self.next_queue.pop(0))
+        if not self.bag:
+            self.bag = new_bag(self.rng)
+        self.next_queue.append(self.bag.pop())
+        return valid(self.current, self.board)
+
+    def handle_line_clear(self, cleared, lines_cleared):
+        if cleared > 0:
+            self.combo += 1
+            self.total_lines += cleared
+            self.level = 1 + self.total_lines // 10
+
+            base_points = scoring_for_lines(cleared, self.level)
+            combo_bonus = 50 * (self.combo - 1) * self.level if self.combo > 1 else 0
+
+            if is_tetris(cleared):
+                if self.b2b:
+                    base_points = int(base_points * 1.5)
+                self.b2b = True
+            else:
+                self.b2b = False
+
+            self.score += base_points + combo_bonus
+            self.clear_events.append(lines_cleared[:])
+        else:
+            self.combo = 0
+
+    def lock_current(self):
+        if above_top(self.current):
+            self.game_over = True
+            return False
+
+        lock_piece(self.current, self.board)
+        _, cleared, lines_cleared = clear_lines(self.board)
+        self.handle_line_clear(cleared, lines_cleared)
+        self.pieces_placed += 1
+
+        self.can_hold = True
+        if not self.spawn_next():
+            self.game_over = True
+            return False
+        return True
+
+    def ghost_y(self):
+        current = self.current
+        key = (current.kind, current.x, current.y, current.rot, self.board.version)
+        if key != self.ghost_key:
+            self.ghost_key = key
+            self.ghost_cache = get_drop_y(current, self.board)
+        return self.ghost_cache
+
+    def hard_drop(self):
+        drop_y = self.ghost_y()
+        current = self.current
+        distance = drop_y - current.y
+        self.current = piece_at(current.kind, current.x, drop_y, current.rot)
+        self.score += distance * 2
+        return self.lock_current()
+
+    def hold_piece(self):
+        if not self.can_hold:
+            return False
+        self.can_hold = False
+        if self.hold is None:
+            self.hold = self.current.kind
+            if not self.spawn_next():
+                self.game_over = True
+        else:
+            self.hold, self.current = self.current.kind, spawn_piece(self.hold)
+            if not valid(self.current, self.board):
+                self.game_over = True
+        return True
+
+    def add_garbage(self, lines, hole):
+        # The falling piece rides up with the stack if it has to.
+        if self.game_over or lines <= 0:
+            return
+        lines = min(lines, ROWS)
+        if add_garbage(self.board, lines, hole):
+            self.game_over = True
+            return
+        current = self.current
+        for lift in range(lines + 1):
+            if fits(current.kind, current.rot, current.x, current.y - lift, self.board):
+                self.current = piece_at(current.kind, current.x, current.y - lift, current.rot)
+                return
+        self.game_over = True
+
+    def gravity_step(self):
+        if self.try_move(0, 1):
+            return True
+        self.lock_current()
+        return False
+
+    def step(self, action):
+        if self.game_over:
+            return False
+        if action == ACTION_LEFT:
+            return self.try_move(-1, 0)
+        if action == ACTION_RIGHT:
+            return self.try_move(1, 0)
+        if action == ACTION_DOWN:
+            return self.gravity_step()
+        if action == ACTION_ROTATE_CW:
+            return self.try_rotate(1)
+        if action == ACTION_ROTATE_CCW:
+            return self.try_rotate(-1)
+        if action == ACTION_HARD_DROP:
+            return self.hard_drop()
+        if action == ACTION_HOLD:
+            return self.hold_piece()
+        if action == ACTION_SOFT_DROP_ON:
+            self.soft_drop = True
+            return True
+        if action == ACTION_SOFT_DROP_OFF:
+            self.soft_drop = False
+            return True
+        raise ValueError(f"unknown action: {action!r}")
+
+    def gravity_ms(self):
+        speed = fall_speed_ms(self.level)
+        if self.soft_drop:
+            speed = max(30, speed // 10)
+        return speed
+
+    def tick(self, ms):
+        # Leftover time carries into the next interval, and a long tick
+        # drops several rows, so fall speed doesn't depend on how the time
+        # is sliced. A piece that locks takes the leftover with it.
+        if self.game_over:
+            return
+        self.fall_timer += ms
+        while not self.game_over:
+            speed = self.gravity_ms()
+            if self.fall_timer < speed:
+                break
+            self.fall_timer -= speed
+            if not self.gravity_step():
+                self.fall_timer = 0
+                break
+
+    def pop_clear_events(self):
+        events = self.clear_events
+        self.clear_events = []
+        return events
@@ -0,0 +1,211 @@
+import numpy as np
+
+from engine import COLS, ROWS, FULL_ROW, PIECE_TABLE
+
+# Board metrics for bots and analytics. A row is the same bitmask the
+# engine keeps in Board.rows, so everything that depends on a single row
+# comes from tables indexed by that mask.
+ROW_VALUES = 1 << COLS
+WALLED = 1 | (1 << (COLS + 1))
+WALLED_MASK = (1 << (COLS + 1)) - 1
+
+FEATURE_NAMES = (
+    "aggregate_height",
+    "max_height",
+    "holes",
+    "bumpiness",
+    "row_transitions",
+    "column_transitions",
+    "well_depth",
+    "max_well",
+    "nearly_full",
+)
+
+def row_transitions(row):
+    # Filled/empty changes along the row, with both walls counted filled.
+    walled = (row << 1) | WALLED
+    return ((walled ^ (walled >> 1)) & WALLED_MASK).bit_count()
+
+POPCOUNT = [r.bit_count() for r in range(ROW_VALUES)]
+ROW_TRANSITIONS = [row_transitions(r) for r in range(ROW_VALUES)]
+NEARLY_FULL = [POPCOUNT[r] == COLS - 1 for r in range(ROW_VALUES)]
+
+POPCOUNT_NP = np.array(POPCOUNT, np.int64)
+ROW_TRANSITIONS_NP = np.array(ROW_TRANSITIONS, np.int64)
+NEARLY_FULL_NP = np.array(NEARLY_FULL, np.int64)
+COLUMN_BITS = np.array([1 << x for x in range(COLS)], np.int64)
+
+def well_depths(heights):
+    # How far each column sits below the lower of its neighbours, with the
+    # walls as tall as the playfield.
+    depths = []
+    for x in range(COLS):
+        left = heights[x - 1] if x > 0 else ROWS
+        right = heights[x + 1] if x < COLS - 1 else ROWS
+        depths.append(max(0, min(left, right) - heights[x]))
+    return depths
+
+class Features:
+    __slots__ = ("heights", "wells") + FEATURE_NAMES
+
+    def __init__(self, heights, holes, row_trans, col_trans, nearly_full):
+        self.heights = heights
+        self.wells = well_depths(heights)
+        self.aggregate_height = sum(heights)
+        self.max_height = max(heights)
+        self.holes = holes
+        self.bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+        self.row_transitions = row_trans
+        self.column_transitions = col_trans
+        self.well_depth = sum(self.wells)
+        self.max_well = max(self.wells)
+        self.nearly_full = nearly_full
+
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in FEATURE_NAMES)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in FEATURE_NAMES}
+
+def row_features(rows):
+    holes = 0
+    row_trans = 0
+    col_trans = 0
+    nearly_full = 0
+    covered = 0
+    above = 0
+    for r in rows:
+        holes += POPCOUNT[covered & ~r & FULL_ROW]
+        row_trans += ROW_TRANSITIONS[r]
+        col_trans += POPCOUNT[above ^ r]
+        nearly_full += NEARLY_FULL[r]
+        covered |= r
+        above = r
+    col_trans += POPCOUNT[above ^ FULL_ROW]
+    return holes, row_trans, col_trans, nearly_full
+
+def board_features(board):
+    # Board.heights is kept up to date by lock_piece() and clear_lines(),
+    # so only the per-row metrics need a pass over the rows.
+    return Features(board.heights[:], *row_features(board.rows))
+
+def heights_and_holes(rows):
+    # Just the two metrics the bot scores every candidate on, in one pass.
+    heights = [0] * COLS
+    covered = 0
+    holes = 0
+    for y, r in enumerate(rows):
+        holes += POPCOUNT[covered & ~r & FULL_ROW]
+        fresh = r & ~covered
+        while fresh:
+            low = fresh & -fresh
+            heights[low.bit_length() - 1] = ROWS - y
+            fresh ^= low
+        covered |= r
+    return heights, holes
+
+def rows_features(rows):
+    heights, _ = heights_and_holes(rows)
+    return Features(heights, *row_features(rows))
+
+COLUMN_SPANS = {
+    kind: [
+        tuple(
+            (cx, min(cy for ox, cy in shape.offsets if ox == cx), bottom)
+            for cx, bottom in shape.columns
+        )
+        for shape in shapes
+    ]
+    for kind, shapes in PIECE_TABLE.items()
+}
+
+def placement_rows(rows, placement):
+    # The rows after one placement locks and its lines clear, and how many
+    # lines that was; placement_boards() does the same for a batch.
+    shape = PIECE_TABLE[placement.kind][placement.rot]
+    rows = rows[:]
+    for dy, mask in shape.masks[placement.x - shape.x_lo]:
+        rows[placement.y + dy] |= mask
+    kept = [r for r in rows if r != FULL_ROW]
+    lines = ROWS - len(kept)
+    if lines:
+        kept[:0] = [0] * lines
+    return kept, lines
+
+def placement_features(rows, heights, holes, placement):
+    # Heights, holes and lines cleared after a placement, given the
+    # current board's heights and holes. Most placements clear nothing and
+    # rest on the surface, so those are patched; the rest rescan.
+    kind, x, y, rot = placement.kind, placement.x, placement.y, placement.rot
+    shape = PIECE_TABLE[kind][rot]
+    for dy, mask in shape.masks[x - shape.x_lo]:
+        if rows[y + dy] | mask == FULL_ROW:
+            after, lines = placement_rows(rows, placement)
+            return heights_and_holes(after) + (lines,)
+    heights = heights[:]
+    for cx, top, bottom in COLUMN_SPANS[kind][rot]:
+        col = x + cx
+        surface = ROWS - heights[col]
+        if y + bottom >= surface:
+            after, lines = placement_rows(rows, placement)
+            return heights_and_holes(after) + (lines,)
+        holes += surface - (y + bottom) - 1
+        heights[col] = ROWS - (y + top)
+    return heights, holes, 0
+
+def batch_heights(rows):
+    filled = (rows[:, :, None] & COLUMN_BITS) != 0
+    top = filled.argmax(1)
+    return np.where(filled.any(1), ROWS - top, 0)
+
+def batch_features(rows):
+    # rows is an (N, ROWS) array of row masks, as from BatchGame.boards or
+    # placement_boards(). Returns one array per feature name, plus the
+    # (N, COLS) heights and wells.
+    rows = np.asarray(rows, np.int64)
+    heights = batch_heights(rows)
+    covered = np.bitwise_or.accumulate(rows, axis=1)
+    holes = POPCOUNT_NP[covered[:, :-1] & ~rows[:, 1:] & FULL_ROW].sum(1)
+
+    row_trans = ROW_TRANSITIONS_NP[rows].sum(1)
+    col_trans = (
+        POPCOUNT_NP[rows[:, :-1] ^ rows[:, 1:]].sum(1)
+        + POPCOUNT_NP[rows[:, 0]]
+        + POPCOUNT_NP[rows[:, -1] ^ FULL_ROW]
+    )
+
+    walls = np.full((len(rows), 1), ROWS)
+    padded = np.concatenate([walls, heights, walls], axis=1)
+    wells = np.maximum(0, np.minimum(padded[:, :-2], padded[:, 2:]) - heights)
+
+    return {
+        "heights": heights,
+        "wells": wells,
+        "aggregate_height": heights.sum(1),
+        "max_height": heights.max(1),
+        "holes": holes,
+        "bumpiness": np.abs(np.diff(heights, axis=1)).sum(1),
+        "row_transitions": row_trans,
+        "column_transitions": col_trans,
+        "well_depth": wells.sum(1),
+        "max_well": wells.max(1),
+        "nearly_full": NEARLY_FULL_NP[rows].sum(1),
+    }
+
+def placement_boards(rows, placements):
+    # The board after each placement locks and its lines clear, as an
+    # (N, ROWS) array. Also returns the number of lines each one cleared.
+    boards = np.tile(np.asarray(rows, np.int64), (len(placements), 1))
+    for i, p in enumerate(placements):
+        shape = PIECE_TABLE[p.kind][p.rot]
+        for dy, mask in shape.masks[p.x - shape.x_lo]:
+            boards[i, p.y + dy] |= mask
+    full = boards == FULL_ROW
+    lines = full.sum(1)
+    if lines.any():
+        # A stable sort on the full flag lifts full rows to the top in
+        # board order, where they are then emptied.
+        order = np.argsort(~full, axis=1, kind="stable")
+        boards = np.take_along_axis(boards, order, axis=1)
+        boards[np.arange(ROWS) < lines[:, None]] = 0
+    return boards, lines
@@ -0,0 +1,100 @@
+import cProfile
+import csv
+import pstats
+import sys
+import time
+
+PHASES = ("events", "logic", "background", "board", "particles", "panel", "flip")
+RING_SIZE = 240
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[i]
+
+class FrameProfiler:
+    # Keeps the last RING_SIZE frame times per phase. Marks are no-ops
+    # while inactive, so the game loop can call them unconditionally.
+    def __init__(self, phases=PHASES, size=RING_SIZE):
+        self.phases = phases
+        self.size = size
+        self.rings = {name: [0.0] * size for name in phases}
+        self.frames = 0
+        self.active = False
+        self.last = 0.0
+        self.capture = None
+        self.capture_left = 0
+        self.capture_path = None
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self.frames = 0
+        self.rings = {name: [0.0] * self.size for name in self.phases}
+        self.last = time.perf_counter()
+
+    def stop(self):
+        self.active = False
+
+    def begin_frame(self):
+        if self.active:
+            i = self.frames % self.size
+            for ring in self.rings.values():
+                ring[i] = 0.0
+            self.last = time.perf_counter()
+
+    def mark(self, phase):
+        # Adds the time since the previous mark, so a phase can be marked
+        # more than once per frame.
+        if self.active:
+            now = time.perf_counter()
+            self.rings[phase][self.frames % self.size] += (now - self.last) * 1000
+            self.last = now
+
+    def end_frame(self):
+        if self.active:
+            self.frames += 1
+        if self.capture is not None:
+            self.capture_left -= 1
+            if self.capture_left <= 0:
+                self.finish_capture()
+
+    def samples(self, phase):
+        ring = self.rings[phase]
+        n = min(self.frames, self.size)
+        if self.frames <= self.size:
+            return ring[:n]
+        i = self.frames % self.size
+        return ring[i:] + ring[:i]
+
+    def stats(self):
+        rows = []
+        for phase in self.phases:
+            values = sorted(self.samples(phase))
+            rows.append((phase, percentile(values, 0.5), percentile(values, 0.99)))
+        return rows
+
+    def export_csv(self, path):
+        columns = [self.samples(phase) for phase in self.phases]
+        first = max(0, self.frames - self.size)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame",) + tuple(f"{phase}_ms" for phase in self.phases))
+            for i, row in enumerate(zip(*columns)):
+                writer.writerow((first + i,) + tuple(f"{ms:.4f}" for ms in row))
+
+    def capture_frames(self, frames, path):
+        if self.capture is not None:
+            return
+        self.capture = cProfile.Profile()
+        self.capture_left = frames
+        self.capture_path = path
+        self.capture.enable()
+
+    def finish_capture(self):
+        self.capture.disable()
+        self.capture.dump_stats(self.capture_path)
+        pstats.Stats(self.capture, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+        self.capture = None
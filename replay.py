@@ -0,0 +1,176 @@
+import sys
+
+from engine import ACTIONS, ACTION_CODES, GameState
+
+# File layout: MAGIC, varint version, varint seed, then records. Each
+# record is varint((frames << 4) | code): run `frames` ticks at the current
+# tick length, then apply `code`. Codes below len(ACTIONS) are inputs;
+# CODE_TICK_MS is followed by a varint giving the new tick length.
+MAGIC = b"NTRP"
+VERSION = 2
+CODE_TICK_MS = 14
+CODE_END = 15
+DEFAULT_TICK_MS = 16
+READ_CHUNK = 1 << 16
+
+def append_varint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def write_varint(out, n):
+    buf = bytearray()
+    append_varint(buf, n)
+    out.write(buf)
+
+def read_varint(data, pos):
+    n = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+class ReplayError(Exception):
+    pass
+
+class ReplayWriter:
+    def __init__(self, out, seed):
+        self.out = out
+        self.frames = 0
+        self.pending = 0
+        self.tick_ms = DEFAULT_TICK_MS
+        out.write(MAGIC)
+        write_varint(out, VERSION)
+        write_varint(out, seed)
+
+    def record(self, code, arg=None):
+        write_varint(self.out, (self.pending << 4) | code)
+        if arg is not None:
+            write_varint(self.out, arg)
+        self.pending = 0
+
+    def action(self, action):
+        self.record(ACTION_CODES[action])
+
+    def tick(self, ms):
+        if ms != self.tick_ms:
+            self.record(CODE_TICK_MS, ms)
+            self.tick_ms = ms
+        self.pending += 1
+        self.frames += 1
+
+    def close(self):
+        self.record(CODE_END)
+        self.out.close()
+
+class ReplayReader:
+    def __init__(self, f):
+        self.f = f
+        self.buf = b""
+        self.pos = 0
+        if self.read_bytes(len(MAGIC)) != MAGIC:
+            raise ReplayError("not a replay file")
+        version = self.read_varint()
+        if version != VERSION:
+            raise ReplayError(f"unsupported replay version {version}")
+        self.seed = self.read_varint()
+
+    def fill(self):
+        self.buf = self.buf[self.pos:] + self.f.read(READ_CHUNK)
+        self.pos = 0
+
+    def read_bytes(self, n):
+        if self.pos + n > len(self.buf):
+            self.fill()
+        data = self.buf[self.pos:self.pos + n]
+        self.pos += len(data)
+        return data
+
+    def read_varint(self):
+        n = 0
+        shift = 0
+        while True:
+            if self.pos >= len(self.buf):
+                self.fill()
+                if not self.buf:
+                    raise ReplayError("truncated replay")
+            b = self.buf[self.pos]
+            self.pos += 1
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def records(self):
+        while True:
+            head = self.read_varint()
+            frames, code = head >> 4, head & 0xF
+            arg = self.read_varint() if code == CODE_TICK_MS else None
+            yield frames, code, arg
+            if code == CODE_END:
+                return
+
+class ReplayPlayer:
+    def __init__(self, f):
+        self.reader = ReplayReader(f)
+        self.state = GameState(self.reader.seed)
+        self.records = self.reader.records()
+        self.frame = 0
+        self.tick_ms = DEFAULT_TICK_MS
+        self.waiting = 0
+        self.next_code = None
+        self.next_arg = None
+        self.finished = False
+
+    def load_next(self):
+        frames, code, arg = next(self.records)
+        self.waiting = frames
+        self.next_code = code
+        self.next_arg = arg
+
+    def apply_pending(self):
+        while not self.finished and self.waiting == 0:
+            if self.next_code is not None:
+                code, arg = self.next_code, self.next_arg
+                self.next_code = None
+                if code == CODE_END:
+                    self.finished = True
+                    return
+                if code == CODE_TICK_MS:
+                    self.tick_ms = arg
+                else:
+                    self.state.step(ACTIONS[code])
+            self.load_next()
+
+    def step_frame(self):
+        self.apply_pending()
+        if self.finished:
+            return False
+        self.state.tick(self.tick_ms)
+        self.waiting -= 1
+        self.frame += 1
+        return True
+
+    def seek(self, frame):
+        while self.frame < frame and self.step_frame():
+            pass
+        return self.state
+
+    def run(self):
+        while self.step_frame():
+            pass
+        return self.state
+
+if __name__ == "__main__":
+    path = sys.argv[1]
+    target = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    with open(path, "rb") as f:
+        player = ReplayPlayer(f)
+        state = player.run() if target is None else player.seek(target)
+    print(f"frame={player.frame} seed={player.reader.seed} score={state.score} "
+          f"lines={state.total_lines} level={state.level} game_over={state.game_over}")
@@ -0,0 +1,143 @@
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bot import Bot
+from engine import (
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW,
+    ACTION_HARD_DROP,
+    GameState,
+)
+
+FIELDS = ["seed", "score", "lines", "level", "pieces", "game_over", "game_seconds", "wall_seconds", "pieces_per_second"]
+FRAME_MS = 16
+
+def bot_policy(seed):
+    bot = Bot()
+    return bot.plan
+
+def random_policy(seed):
+    rng = random.Random(seed)
+    moves = [ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE_CW, ACTION_ROTATE_CCW]
+
+    def plan(state):
+        return [rng.choice(moves) for _ in range(rng.randint(0, 5))] + [ACTION_HARD_DROP]
+    return plan
+
+POLICIES = {
+    "bot": bot_policy,
+    "random": random_policy,
+}
+
+def play_game(seed, policy="bot", max_pieces=1000, think_ms=0):
+    state = GameState(seed)
+    plan = POLICIES[policy](seed)
+    game_ms = 0
+    start = time.perf_counter()
+    while not state.game_over and state.pieces_placed < max_pieces:
+        placed = state.pieces_placed
+        waited = 0
+        while waited < think_ms and not state.game_over and state.pieces_placed == placed:
+            state.tick(FRAME_MS)
+            waited += FRAME_MS
+        game_ms += waited
+        if state.game_over or state.pieces_placed != placed:
+            continue
+        for action in plan(state):
+            state.step(action)
+    wall = time.perf_counter() - start
+    return {
+        "seed": seed,
+        "score": state.score,
+        "lines": state.total_lines,
+        "level": state.level,
+        "pieces": state.pieces_placed,
+        "game_over": state.game_over,
+        "game_seconds": game_ms / 1000,
+        "wall_seconds": round(wall, 6),
+        "pieces_per_second": round(state.pieces_placed / wall, 1) if wall else 0.0,
+    }
+
+def play_chunk(seeds, policy, max_pieces, think_ms):
+    return [play_game(seed, policy, max_pieces, think_ms) for seed in seeds]
+
+def chunked(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def run_tournament(seeds, policy="bot", max_pieces=1000, think_ms=0, workers=None, chunk=16):
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(play_chunk, part, policy, max_pieces, think_ms)
+            for part in chunked(list(seeds), chunk)
+        ]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def summarize(results, elapsed):
+    summary = {"games": len(results), "elapsed_seconds": round(elapsed, 3)}
+    if not results:
+        return summary
+    for field in ("score", "lines", "level", "pieces"):
+        values = [r[field] for r in results]
+        summary[field] = {
+            "mean": round(statistics.fmean(values), 2),
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+    pieces = sum(r["pieces"] for r in results)
+    summary["pieces_per_second"] = round(pieces / elapsed, 1) if elapsed else 0.0
+    summary["topped_out"] = sum(r["game_over"] for r in results)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded headless games in parallel.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="bot")
+    parser.add_argument("--max-pieces", type=int, default=1000)
+    parser.add_argument("--think-ms", type=int, default=0, help="gravity time simulated before each placement")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=16, help="games per work unit")
+    parser.add_argument("--csv", help="write one row per game to this file")
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args(argv)
+
+    seeds = range(args.seed, args.seed + args.games)
+    out = open(args.csv, "w", newline="") if args.csv else None
+    writer = csv.DictWriter(out, FIELDS) if out else None
+    if writer:
+        writer.writeheader()
+
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in run_tournament(seeds, args.policy, args.max_pieces, args.think_ms, args.workers, args.chunk):
+            results.append(result)
+            if writer:
+                writer.writerow(result)
+                out.flush()
+    finally:
+        if out:
+            out.close()
+    summary = summarize(results, time.perf_counter() - start)
+
+    text = json.dumps(summary, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
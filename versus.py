@@ -0,0 +1,494 @@
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections import deque
+
+from engine import ACTIONS, ACTION_CODES, COLS, ROWS, GARBAGE, SHAPES, Board, GameState, piece_at
+from replay import append_varint, read_varint
+from tournament import POLICIES
+
+HOST = "127.0.0.1"
+PORT = 7777
+TICK_MS = 16
+MAX_INPUTS_PER_TICK = 8
+WRITE_LIMIT = 1 << 16
+MAX_FRAME = 1 << 10
+QUEUE_PREVIEW = 5
+GARBAGE_FOR_LINES = {2: 1, 3: 2, 4: 4}
+
+# Every message is varint(length) + payload, and a payload starts with
+# its type byte. Inputs carry a sequence number that state messages echo
+# back, so a client knows which of its predicted inputs the server has
+# already applied.
+MSG_INPUT = 1
+MSG_START = 2
+MSG_STATE = 3
+MSG_END = 4
+
+RESULT_LOSS = 0
+RESULT_WIN = 1
+RESULT_DRAW = 2
+
+# A state message carries a bitmask of the sections that follow; a
+# section is only sent when it differs from what the client last got.
+SYNC_ROWS = 1
+SYNC_PIECE = 2
+SYNC_HOLD = 4
+SYNC_STATS = 8
+SYNC_QUEUE = 16
+SYNC_ATTACK = 32
+
+KINDS = tuple(SHAPES)
+KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+
+class ProtocolError(Exception):
+    pass
+
+def frame(payload):
+    buf = bytearray()
+    append_varint(buf, len(payload))
+    buf += payload
+    return bytes(buf)
+
+async def read_frame(reader):
+    n = 0
+    shift = 0
+    while True:
+        b = (await reader.readexactly(1))[0]
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            break
+        shift += 7
+        if shift > 28:
+            raise ProtocolError("frame length overflows")
+    if n > MAX_FRAME:
+        raise ProtocolError(f"frame of {n} bytes is over {MAX_FRAME}")
+    return await reader.readexactly(n)
+
+def pack_piece(piece):
+    # Garbage can lift a piece any distance above the board, so y goes on
+    # top, zigzag-coded, where the varint leaves it unbounded.
+    y = piece.y * 2 if piece.y >= 0 else -piece.y * 2 - 1
+    return ((y * 8 + KIND_INDEX[piece.kind]) * 16 + piece.x + 4) * 4 + piece.rot
+
+def unpack_piece(code):
+    rest, rot = divmod(code, 4)
+    rest, x = divmod(rest, 16)
+    y, kind = divmod(rest, 8)
+    y = y // 2 if y % 2 == 0 else -(y + 1) // 2
+    return piece_at(KINDS[kind], x - 4, y, rot)
+
+def pack_queue(queue):
+    code = 0
+    for i, kind in enumerate(queue[:QUEUE_PREVIEW]):
+        code |= KIND_INDEX[kind] << (3 * i)
+    return code
+
+def unpack_queue(code):
+    return [KINDS[(code >> (3 * i)) & 7] for i in range(QUEUE_PREVIEW)]
+
+class SyncView:
+    # The last values sent to (or received by) a client.
+    __slots__ = ("rows", "piece", "hold", "stats", "queue", "attack", "ack")
+
+    def __init__(self):
+        self.rows = [0] * ROWS
+        self.piece = None
+        self.hold = None
+        self.stats = None
+        self.queue = None
+        self.attack = None
+        self.ack = 0
+
+def encode_state(state, ack, view, attack):
+    body = bytearray()
+    flags = 0
+
+    rows = state.board.rows
+    sent = view.rows
+    changed = 0
+    for y in range(ROWS):
+        if rows[y] != sent[y]:
+            changed |= 1 << y
+    if changed:
+        flags |= SYNC_ROWS
+        append_varint(body, changed)
+        for y in range(ROWS):
+            if changed >> y & 1:
+                append_varint(body, rows[y])
+        view.rows = rows[:]
+
+    sections = (
+        (SYNC_PIECE, "piece", pack_piece(state.current)),
+        (SYNC_HOLD, "hold", (0 if state.hold is None else 1 + KIND_INDEX[state.hold]) * 2 + state.can_hold),
+        (SYNC_STATS, "stats", (state.score, state.total_lines, state.level)),
+        (SYNC_QUEUE, "queue", pack_queue(state.next_queue)),
+        (SYNC_ATTACK, "attack", attack),
+    )
+    for flag, name, value in sections:
+        if value != getattr(view, name):
+            flags |= flag
+            setattr(view, name, value)
+            for n in value if isinstance(value, tuple) else (value,):
+                append_varint(body, n)
+
+    if not flags and ack == view.ack:
+        return None
+    view.ack = ack
+    head = bytearray((MSG_STATE,))
+    append_varint(head, ack)
+    append_varint(head, flags)
+    return head + body
+
+def decode_state(payload, view):
+    ack, pos = read_varint(payload, 1)
+    flags, pos = read_varint(payload, pos)
+    view.ack = ack
+    if flags & SYNC_ROWS:
+        changed, pos = read_varint(payload, pos)
+        rows = view.rows[:]
+        for y in range(ROWS):
+            if changed >> y & 1:
+                rows[y], pos = read_varint(payload, pos)
+        view.rows = rows
+    if flags & SYNC_PIECE:
+        view.piece, pos = read_varint(payload, pos)
+    if flags & SYNC_HOLD:
+        view.hold, pos = read_varint(payload, pos)
+    if flags & SYNC_STATS:
+        score, pos = read_varint(payload, pos)
+        lines, pos = read_varint(payload, pos)
+        level, pos = read_varint(payload, pos)
+        view.stats = (score, lines, level)
+    if flags & SYNC_QUEUE:
+        view.queue, pos = read_varint(payload, pos)
+    if flags & SYNC_ATTACK:
+        pending, pos = read_varint(payload, pos)
+        height, pos = read_varint(payload, pos)
+        view.attack = (pending, height)
+    return flags
+
+class Player:
+    def __init__(self, writer):
+        self.writer = writer
+        self.state = None
+        self.inputs = deque()
+        self.ack = 0
+        self.view = SyncView()
+        self.pending = 0
+        self.placed = 0
+        self.bytes_sent = 0
+        self.connected = True
+
+    def send(self, payload):
+        if not self.connected:
+            return
+        if self.writer.transport.get_write_buffer_size() > WRITE_LIMIT:
+            # A client that stops reading is dropped, not buffered for.
+            self.close()
+            return
+        data = frame(payload)
+        self.bytes_sent += len(data)
+        self.writer.write(data)
+
+    def close(self):
+        self.connected = False
+        self.writer.close()
+
+class Match:
+    # Both players get the same seed, so they see the same pieces.
+    def __init__(self, a, b, seed):
+        self.players = (a, b)
+        self.rng = random.Random(seed)
+        self.finished = False
+        for i, player in enumerate(self.players):
+            player.state = GameState(seed)
+            start = bytearray((MSG_START,))
+            append_varint(start, seed)
+            append_varint(start, i)
+            player.send(start)
+
+    def attack(self, player, other, cleared):
+        lines = sum(GARBAGE_FOR_LINES.get(len(rows), 0) for rows in cleared)
+        cancel = min(lines, player.pending)
+        player.pending -= cancel
+        other.pending += lines - cancel
+
+    def tick(self):
+        a, b = self.players
+        for player, other in ((a, b), (b, a)):
+            state = player.state
+            for _ in range(min(MAX_INPUTS_PER_TICK, len(player.inputs))):
+                seq, code = player.inputs.popleft()
+                state.step(ACTIONS[code])
+                player.ack = seq
+            state.tick(TICK_MS)
+            cleared = state.pop_clear_events()
+            self.attack(player, other, cleared)
+            if state.pieces_placed != player.placed:
+                # Garbage lands when a piece locks without clearing.
+                player.placed = state.pieces_placed
+                if player.pending and not cleared:
+                    state.add_garbage(player.pending, self.rng.randrange(COLS))
+                    player.pending = 0
+
+        for player, other in ((a, b), (b, a)):
+            attack = (player.pending, max(other.state.board.heights))
+            payload = encode_state(player.state, player.ack, player.view, attack)
+            if payload is not None:
+                player.send(payload)
+
+        out = [p.state.game_over or not p.connected for p in self.players]
+        if any(out):
+            for player, lost, won in zip(self.players, out, reversed(out)):
+                result = RESULT_DRAW if lost and won else RESULT_LOSS if lost else RESULT_WIN
+                player.send(bytes((MSG_END, result)))
+                if player.connected:
+                    player.close()
+            self.finished = True
+
+class VersusServer:
+    # Every match is stepped from one ticker task, so a few hundred
+    # matches cost one wakeup per tick rather than one each.
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.matches = []
+        self.waiting = None
+        self.ticks = 0
+        self.late_ticks = 0
+        self.server = None
+        self.ticker = None
+
+    async def start(self, host=HOST, port=PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.ticker = asyncio.create_task(self.run())
+        return self
+
+    async def stop(self):
+        self.ticker.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        player = Player(writer)
+        if self.waiting is None or not self.waiting.connected:
+            self.waiting = player
+        else:
+            self.matches.append(Match(self.waiting, player, self.rng.randrange(1 << 32)))
+            self.waiting = None
+        try:
+            while player.connected:
+                payload = await read_frame(reader)
+                if not payload or payload[0] != MSG_INPUT:
+                    raise ProtocolError("expected an input message")
+                try:
+                    seq, pos = read_varint(payload, 1)
+                    code, pos = read_varint(payload, pos)
+                except IndexError:
+                    raise ProtocolError("truncated input message") from None
+                if code < len(ACTIONS):
+                    player.inputs.append((seq, code))
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            player.connected = False
+            writer.close()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            for match in self.matches:
+                match.tick()
+            self.matches = [m for m in self.matches if not m.finished]
+            self.ticks += 1
+            deadline += TICK_MS / 1000
+            delay = deadline - loop.time()
+            if delay < 0:
+                self.late_ticks += 1
+                deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+def board_from_rows(rows, local):
+    # Rebuilds colors for the server's rows: cells the prediction also
+    # has filled keep their kind, anything else shows as garbage.
+    colors = []
+    for y, bits in enumerate(rows):
+        known = local.rows[y]
+        row = local.colors[y]
+        colors.append([
+            (row[x] if known >> x & 1 else GARBAGE) if bits >> x & 1 else None
+            for x in range(COLS)
+        ])
+    return Board(list(rows), colors)
+
+class VersusClient:
+    # Applies its own inputs at once and reconciles with every state
+    # message: take the server's view, then replay the inputs it has not
+    # acknowledged yet.
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.state = None
+        self.view = SyncView()
+        self.player = None
+        self.seq = 0
+        self.unacked = deque()
+        self.bytes_received = 0
+        self.messages = 0
+        self.corrections = 0
+        self.result = None
+        self.pending = 0
+        self.opponent_height = 0
+
+    async def connect(self, host=HOST, port=PORT):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def wait_start(self):
+        payload = await self.read()
+        seed, pos = read_varint(payload, 1)
+        self.player, pos = read_varint(payload, pos)
+        self.state = GameState(seed)
+
+    async def read(self):
+        payload = await read_frame(self.reader)
+        self.bytes_received += len(payload) + 1
+        self.messages += 1
+        return payload
+
+    def send_action(self, action):
+        self.seq += 1
+        buf = bytearray((MSG_INPUT,))
+        append_varint(buf, self.seq)
+        append_varint(buf, ACTION_CODES[action])
+        self.writer.write(frame(buf))
+        self.unacked.append((self.seq, action))
+        self.state.step(action)
+
+    def reconcile(self, payload):
+        decode_state(payload, self.view)
+        view = self.view
+        while self.unacked and self.unacked[0][0] <= view.ack:
+            self.unacked.popleft()
+
+        state = self.state
+        c = state.current
+        before = (tuple(state.board.rows), c.kind, c.x, c.y, c.rot)
+        if state.board.rows != view.rows:
+            state.board = board_from_rows(view.rows, state.board)
+        if view.piece is not None:
+            state.current = unpack_piece(view.piece)
+        if view.hold is not None:
+            hold, can_hold = divmod(view.hold, 2)
+            state.hold = None if hold == 0 else KINDS[hold - 1]
+            state.can_hold = bool(can_hold)
+        if view.stats is not None:
+            state.score, state.total_lines, state.level = view.stats
+        if view.queue is not None:
+            state.next_queue[:QUEUE_PREVIEW] = unpack_queue(view.queue)
+        if view.attack is not None:
+            self.pending, self.opponent_height = view.attack
+        state.game_over = False
+        for _, action in self.unacked:
+            state.step(action)
+        c = state.current
+        if (tuple(state.board.rows), c.kind, c.x, c.y, c.rot) != before:
+            self.corrections += 1
+
+    async def receive(self):
+        while True:
+            payload = await self.read()
+            if payload[0] == MSG_STATE:
+                self.reconcile(payload)
+            elif payload[0] == MSG_END:
+                self.result = payload[1]
+                return
+
+    async def play(self, plan, think_ms=250, seconds=None):
+        await self.wait_start()
+        receiver = asyncio.create_task(self.receive())
+        loop = asyncio.get_running_loop()
+        end = None if seconds is None else loop.time() + seconds
+        think = 0
+        try:
+            while not receiver.done() and (end is None or loop.time() < end):
+                await asyncio.sleep(TICK_MS / 1000)
+                self.state.tick(TICK_MS)
+                think += TICK_MS
+                if think >= think_ms and not self.state.game_over:
+                    think = 0
+                    for action in plan(self.state):
+                        self.send_action(action)
+        finally:
+            receiver.cancel()
+            self.writer.close()
+
+async def serve(host, port):
+    server = await VersusServer().start(host, port)
+    print(f"versus server on {host}:{port}")
+    async with server.server:
+        await server.server.serve_forever()
+
+async def load_test(matches, seconds, policy, think_ms, host, port, external):
+    server = None if external else await VersusServer(seed=0).start(host, port)
+    clients = [VersusClient() for _ in range(2 * matches)]
+    for client in clients:
+        await client.connect(host, port)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client.play(POLICIES[policy](i), think_ms, seconds)
+        for i, client in enumerate(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        await server.stop()
+
+    rates = [c.bytes_received / elapsed for c in clients]
+    report = {
+        "matches": matches,
+        "seconds": round(elapsed, 2),
+        "down_bytes_per_s_mean": round(statistics.fmean(rates), 1),
+        "down_bytes_per_s_max": round(max(rates), 1),
+        "messages_per_s_mean": round(statistics.fmean(c.messages for c in clients) / elapsed, 1),
+        "corrections_mean": round(statistics.fmean(c.corrections for c in clients), 1),
+        "finished": sum(c.result is not None for c in clients),
+    }
+    if server is not None:
+        report["server_ticks"] = server.ticks
+        report["server_late_ticks"] = server.late_ticks
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Two-player versus over TCP.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_cmd = sub.add_parser("serve", help="run a match server")
+    serve_cmd.add_argument("--host", default=HOST)
+    serve_cmd.add_argument("--port", type=int, default=PORT)
+    load_cmd = sub.add_parser("load", help="play many bot matches and report bandwidth")
+    load_cmd.add_argument("--matches", type=int, default=100)
+    load_cmd.add_argument("--seconds", type=float, default=10)
+    load_cmd.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    load_cmd.add_argument("--think-ms", type=int, default=250)
+    load_cmd.add_argument("--host", default=HOST)
+    load_cmd.add_argument("--port", type=int, default=PORT)
+    load_cmd.add_argument("--external", action="store_true", help="use a server that is already running")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+    report = asyncio.run(load_test(
+        args.matches, args.seconds, args.policy, args.think_ms, args.host, args.port, args.external,
+    ))
+    for key, value in report.items():
+        print(f"{key:<24} {value}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])